@@ -0,0 +1,253 @@
+"""
+    Benchmarks the parser on synthetic MIDI files, so changes to its speed and memory can be measured
+
+    Every scenario generates a MIDI file of a known size, number of tracks, running status density
+    and polyphony, then parses it a few times with a MIDIProfile and keeps the best time of every
+    phase (header, event decoding, note pairing and the tempo map), and of writing it back with
+    toBytes. It also measures the peak memory
+    of a parse and the number of memory blocks allocated by the parse that the parsed file still
+    holds, with tracemalloc (it cannot count the blocks that were allocated and freed again)
+    The files are generated from a fixed seed, so every run parses exactly the same bytes
+
+    To run every scenario, save the results, and compare them to a saved run:
+        python3 benchmark.py --output before.json
+        python3 benchmark.py --baseline before.json
+    A scenario that got slower (or uses more memory) than the baseline by more than the tolerance is
+    reported, and the script exits with an error
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from main import MIDIFile, MIDIProfile
+
+# the files that are generated and parsed, by name
+# tracks = the number of tracks with notes (a first track holds the tempo and time signature)
+# notes = the number of notes in every track
+# polyphony = the number of notes played at the same time
+# runningStatus = how often an event leaves out its status byte when it is the same as the last one
+Scenarios = {
+    "small":
+    dict(tracks=2, notes=500, polyphony=2, runningStatus=0.5),
+    "large":
+    dict(tracks=16, notes=10000, polyphony=4, runningStatus=0.5),
+    "running status":
+    dict(tracks=4, notes=10000, polyphony=4, runningStatus=1.0),
+    "no running status":
+    dict(tracks=4, notes=10000, polyphony=4, runningStatus=0.0),
+    "polyphonic":
+    dict(tracks=4, notes=10000, polyphony=32, runningStatus=0.5),
+}
+
+
+# writes an integer as a MIDI variable length value
+def encodeValue(value):
+    out = [value & 0x7F]
+    value >>= 7
+    while value:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    return bytes(reversed(out))
+
+
+# a whole chunk, from its ID and its bytes
+def chunk(chunkID, data):
+    return chunkID + len(data).to_bytes(4, "big") + data
+
+
+def metaEvent(delta, type, data):
+    return encodeValue(delta) + bytes(
+        (0xFF, type)) + encodeValue(len(data)) + data
+
+
+# the bytes of a track of notes
+# the notes come in chords of polyphony notes, and every chord starts before the last one ends
+# notes end with a note on of velocity 0, so every event in the track can use running status
+def generateTrack(rng, channel, notes, polyphony, runningStatus):
+    messages = []  # (tick, is a note on, key, velocity)
+    tick = 0
+    while len(messages) < 2 * notes:
+        duration = rng.choice((120, 240, 480))
+        chord = min(polyphony, notes - len(messages) // 2)
+        for key in rng.sample(range(24, 108), chord):
+            messages.append((tick, 1, key, rng.randint(40, 110)))
+            messages.append((tick + duration, 0, key, 0))
+        tick += duration // 2
+    # notes that end at a tick end before the notes that start at it
+    messages.sort()
+
+    status = 0x90 | channel
+    out = [
+        metaEvent(0, 0x03, b"Track " + str(channel).encode()),
+        encodeValue(0) + bytes((0xC0 | channel, channel)),
+    ]
+    lastTick = 0
+    lastStatus = 0xC0 | channel
+    for tick, on, key, velocity in messages:
+        out.append(encodeValue(tick - lastTick))
+        if status != lastStatus or rng.random() >= runningStatus:
+            out.append(bytes((status, )))
+        out.append(bytes((key, velocity)))
+        lastTick = tick
+        lastStatus = status
+    out.append(metaEvent(0, 0x2F, b""))
+    return chunk(b"MTrk", b"".join(out))
+
+
+# the bytes of a whole format 1 MIDI file (see Scenarios for the arguments)
+def generateMIDI(tracks=4,
+                 notes=1000,
+                 polyphony=4,
+                 runningStatus=0.5,
+                 division=480,
+                 seed=0):
+    rng = random.Random(seed)
+    conductor = chunk(
+        b"MTrk",
+        metaEvent(0, 0x51, (500000).to_bytes(3, "big")) +
+        metaEvent(0, 0x58, bytes((4, 2, 24, 8))) + metaEvent(0, 0x2F, b""))
+    header = chunk(b"MThd",
+                   (1).to_bytes(2, "big") + (tracks + 1).to_bytes(2, "big") +
+                   division.to_bytes(2, "big"))
+    return header + conductor + b"".join(
+        generateTrack(rng, channel % 16, notes, polyphony, runningStatus)
+        for channel in range(tracks))
+
+
+# parses a file repeat times (and writes it back with toBytes), and measures the memory of one more
+# parse
+# gives the best time of every phase (in milliseconds), the events decoded every second, the best
+# time to write the file, the peak memory of a parse and the number of memory blocks allocated by
+# the parse that the parsed file still holds (heldBlocks, not every allocation made)
+def benchmarkFile(filename, repeat=5, fromBuffer=True):
+    best = None
+    writeSeconds = None
+    for i in range(repeat):
+        profile = MIDIProfile()
+        midi = MIDIFile(filename, fromBuffer, profile=profile)
+        if best is None:
+            best = profile
+        else:
+            for phase, seconds in profile.times.items():
+                best.times[phase] = min(best.times[phase], seconds)
+
+        start = time.perf_counter()
+        midi.toBytes()
+        seconds = time.perf_counter() - start
+        if writeSeconds is None or seconds < writeSeconds:
+            writeSeconds = seconds
+
+    tracemalloc.start()
+    midi = MIDIFile(filename, fromBuffer)
+    current, peak = tracemalloc.get_traced_memory()
+    heldBlocks = sum(
+        stat.count
+        for stat in tracemalloc.take_snapshot().statistics("filename"))
+    tracemalloc.stop()
+    del midi
+
+    result = {
+        "bytes": best.counters["bytes"],
+        "events": best.counters["events"],
+        "notes": best.counters["notes"],
+        "totalMs": best.total() * 1000,
+        "eventsPerSecond": best.eventsPerSecond(),
+        "writeMs": writeSeconds * 1000,
+        "peakBytes": peak,
+        "heldBlocks": heldBlocks,
+    }
+    for phase, seconds in best.times.items():
+        result[phase + "Ms"] = seconds * 1000
+    return result
+
+
+# generates and benchmarks the given scenarios (by default all of them)
+def runScenarios(names=None, repeat=5, fromBuffer=True):
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for name in names or Scenarios:
+            filename = os.path.join(directory, "benchmark.mid")
+            with open(filename, "wb") as f:
+                f.write(generateMIDI(**Scenarios[name]))
+            results[name] = benchmarkFile(filename, repeat, fromBuffer)
+    return results
+
+
+# the scenarios that are slower, or use more memory, than in the baseline
+# tolerance = how much worse a scenario can be before it is reported, 0.2 is 20%
+def regressions(results, baseline, tolerance=0.2):
+    found = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        before = baseline[name]
+        if result["totalMs"] > before["totalMs"] * (1 + tolerance):
+            found.append(name + ": " + format(before["totalMs"], ".2f") +
+                         " ms -> " + format(result["totalMs"], ".2f") + " ms")
+        if result["peakBytes"] > before["peakBytes"] * (1 + tolerance):
+            found.append(name + ": peak " + str(before["peakBytes"]) +
+                         " bytes -> " + str(result["peakBytes"]) + " bytes")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the parser on synthetic MIDI files")
+    parser.add_argument("scenarios",
+                        nargs="*",
+                        help="scenarios to run (default: all of them): " +
+                        ", ".join(Scenarios))
+    parser.add_argument("-n",
+                        "--repeat",
+                        type=int,
+                        default=5,
+                        help="parses of every file, the best one is kept")
+    parser.add_argument("--stream",
+                        action="store_true",
+                        help="benchmark parseFile instead of parseBuffer")
+    parser.add_argument("-o",
+                        "--output",
+                        default=None,
+                        help="save the results as JSON")
+    parser.add_argument("--baseline",
+                        default=None,
+                        help="compare to results saved with --output")
+    parser.add_argument("--tolerance",
+                        type=float,
+                        default=0.2,
+                        help="how much slower than the baseline is allowed")
+    args = parser.parse_args()
+    for name in args.scenarios:
+        if name not in Scenarios:
+            parser.error("unknown scenario: " + name)
+
+    results = runScenarios(args.scenarios, args.repeat, not args.stream)
+    for name, result in results.items():
+        print(name + ": " + str(result["events"]) + " events in " +
+              format(result["totalMs"], ".2f") + " ms (header " +
+              format(result["headerMs"], ".3f") + ", decode " +
+              format(result["decodeMs"], ".2f") + ", notes " +
+              format(result["notesMs"], ".2f") + "), write " +
+              format(result["writeMs"], ".2f") + " ms, " +
+              format(result["eventsPerSecond"] / 1e6, ".2f") +
+              "M events/s, peak " + format(result["peakBytes"] / 1e6, ".2f") +
+              " MB, " + str(result["heldBlocks"]) + " blocks held")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=1)
+    if args.baseline:
+        with open(args.baseline) as f:
+            found = regressions(results, json.load(f), args.tolerance)
+        for regression in found:
+            print("Regression: " + regression)
+        if found:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
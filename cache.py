@@ -0,0 +1,278 @@
+"""
+    A cache on disk for parsed MIDI files, so the same file does not need to be parsed again
+
+    Files are found by a hash of their bytes and the version of the parser, so a changed file (or a
+    newer parser) is always parsed again
+    Every file in the cache holds the header, the tempo and the names of the tracks as JSON, followed
+    by the event and note tables of every track as raw columns of numbers
+    Loading a file memory maps it and copies every column straight into the array of its table, with
+    no decoding, so the loaded tables can be changed like the tables of a parsed file, and the events
+    and notes are only created from the tables when they are used
+
+    Files are written to a temporary file first and then moved into place, so many processes can
+    share one cache. When the cache is bigger than its limit, the least recently used files are removed
+"""
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+
+from array import array
+
+from main import MIDIFile, MIDIHeader, MIDITrack
+
+
+class MIDICache:
+
+    # the first bytes of every file in the cache, and the version of the layout that follows them
+    Magic = b"MIDC"
+    FormatVersion = 4
+    Extension = ".midc"
+
+    # directory = where the parsed files are kept, it is created if needed
+    # maxBytes = how much space the cache can take on disk
+    def __init__(self, directory, maxBytes=1 << 30):
+        self.directory = directory
+        self.maxBytes = maxBytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    # the key of a file, from its bytes and the versions of the parser and of the layout
+    def key(self, content):
+        h = hashlib.blake2b(digest_size=20)
+        h.update(
+            struct.pack("<II", MIDIFile.ParserVersion,
+                        MIDICache.FormatVersion))
+        h.update(content)
+        return h.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key + MIDICache.Extension)
+
+    # gives the parsed file, from the cache if it is there, otherwise it is parsed and saved
+    def load(self, filename):
+        with open(filename, "rb") as f:
+            content = f.read()
+        key = self.key(content)
+
+        midi = self.read(key)
+        if midi is not None:
+            self.hits += 1
+            return midi
+
+        self.misses += 1
+        midi = MIDIFile()
+        with memoryview(content) as data:
+            midi.parseBuffer(data)
+        self.write(key, midi)
+        return midi
+
+    # reads a parsed file from the cache, None if it is not there (or cannot be used)
+    def read(self, key):
+        path = self.path(key)
+        try:
+            with open(path, "rb") as f:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            # a file that is missing or cannot be read is parsed again
+            return None
+        try:
+            # marks the file as recently used
+            os.utime(path)
+        except OSError:
+            # e.g. a file of another user in a shared cache, which can still be read
+            pass
+
+        try:
+            return self.decode(data)
+        except (ValueError, KeyError, TypeError, struct.error):
+            # a damaged file is parsed again, and replaced
+            return None
+        finally:
+            data.close()
+
+    # creates the parsed file from the bytes of a file in the cache
+    def decode(self, data):
+        if data[:4] != MIDICache.Magic:
+            return None
+        formatVersion, infoLength = struct.unpack_from("<IQ", data, 4)
+        if formatVersion != MIDICache.FormatVersion:
+            return None
+        info = json.loads(data[16:16 + infoLength])
+        if info["byteorder"] != sys.byteorder:
+            return None
+        pos = MIDICache.align(16 + infoLength)
+
+        midi = MIDIFile()
+        fileID, headerLength, nFormat, trackChunks, division = info["header"]
+        midi.header = MIDIHeader(fileID.encode("latin-1"), headerLength,
+                                 nFormat, trackChunks, division)
+        midi.tempo = info["tempo"]
+        midi.bpm = info["bpm"]
+
+        with memoryview(data) as view:
+            for trackInfo in info["tracks"]:
+                track = MIDITrack()
+                track.name = trackInfo["name"]
+                track.instrument = trackInfo["instrument"]
+                track.minNote = trackInfo["minNote"]
+                track.maxNote = trackInfo["maxNote"]
+                track.trackID = trackInfo["trackID"].encode("latin-1")
+                track.trackLength = trackInfo["trackLength"]
+                track.tempoChanges = [
+                    tuple(change) for change in trackInfo["tempoChanges"]
+                ]
+                MIDICache.decodeMeta(track, trackInfo["meta"])
+                # the columns are copied from the memory mapped file into arrays, so they can be changed
+                for table, rows in ((track.eventTable, trackInfo["events"]),
+                                    (track.noteTable, trackInfo["notes"])):
+                    for name, code in table.fields:
+                        size = rows * struct.calcsize(code)
+                        if pos + size > len(view):
+                            raise ValueError("cached file is too short")
+                        column = array(code)
+                        column.frombytes(view[pos:pos + size])
+                        table.columns[name] = column
+                        pos = MIDICache.align(pos + size)
+                midi.tracks.append(track)
+
+        midi.buildTempoMap()
+        return midi
+
+    # saves a parsed file in the cache
+    def write(self, key, midi):
+        header = midi.header
+        info = {
+            "byteorder":
+            sys.byteorder,
+            "header": [
+                header.fileID.decode("latin-1"), header.headerLength,
+                header.format, header.trackChunks, header.division
+            ],
+            "tempo":
+            midi.tempo,
+            "bpm":
+            midi.bpm,
+            "tracks": [{
+                "name": track.name,
+                "instrument": track.instrument,
+                "minNote": track.minNote,
+                "maxNote": track.maxNote,
+                "trackID": track.trackID.decode("latin-1"),
+                "trackLength": track.trackLength,
+                "tempoChanges": track.tempoChanges,
+                "meta": MIDICache.encodeMeta(track),
+                "events": len(track.eventTable),
+                "notes": len(track.noteTable),
+            } for track in midi.tracks],
+        }
+        info = json.dumps(info).encode()
+
+        parts = [
+            MIDICache.Magic,
+            struct.pack("<IQ", MIDICache.FormatVersion, len(info)), info
+        ]
+        size = 16 + len(info)
+        for track in midi.tracks:
+            for table in (track.eventTable, track.noteTable):
+                for name, code in table.fields:
+                    parts.append(bytes(MIDICache.align(size) - size))
+                    column = bytes(table.columns[name])
+                    parts.append(column)
+                    size = MIDICache.align(size) + len(column)
+
+        # written to a temporary file first, so other processes never see half of a file
+        fd, temporary = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(b"".join(parts))
+            os.replace(temporary, self.path(key))
+        except BaseException:
+            os.unlink(temporary)
+            raise
+        self.evict()
+
+    # removes the least recently used files until the cache fits in maxBytes
+    def evict(self):
+        files = []
+        total = 0
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(MIDICache.Extension):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+
+        files.sort()
+        for mtime, size, path in files:
+            if total <= self.maxBytes:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                # another process removed it already
+                pass
+            total -= size
+
+    # the meta information of a track (see MIDITrack), with bytes stored as latin-1 strings
+    # TextFields are lists of (tick, text), TupleFields are lists of tuples of numbers, and
+    # ValueFields are single numbers (or None)
+    TextFields = ("texts", "lyrics", "markers", "cuePoints",
+                  "sequencerSpecific")
+    TupleFields = ("timeSignatures", "keySignatures")
+    ValueFields = ("sequenceNumber", "channelPrefix", "port")
+
+    @staticmethod
+    def encodeMeta(track):
+        meta = {
+            "copyright":
+            None
+            if track.copyright is None else track.copyright.decode("latin-1"),
+            "smpteOffset":
+            track.smpteOffset,
+            "systemExclusive":
+            [(tick, status, data.decode("latin-1"))
+             for tick, status, data in track.systemExclusive],
+            "metaEvents":
+            [(position, tick, status, type, data.decode("latin-1"))
+             for position, tick, status, type, data in track.metaEvents],
+        }
+        for name in MIDICache.TextFields:
+            meta[name] = [(tick, text.decode("latin-1"))
+                          for tick, text in getattr(track, name)]
+        for name in MIDICache.TupleFields + MIDICache.ValueFields:
+            meta[name] = getattr(track, name)
+        return meta
+
+    @staticmethod
+    def decodeMeta(track, meta):
+        if meta["copyright"] is not None:
+            track.copyright = meta["copyright"].encode("latin-1")
+        if meta["smpteOffset"] is not None:
+            track.smpteOffset = tuple(meta["smpteOffset"])
+        track.systemExclusive = [
+            (tick, status, data.encode("latin-1"))
+            for tick, status, data in meta["systemExclusive"]
+        ]
+        track.metaEvents = [
+            (position, tick, status, type, data.encode("latin-1"))
+            for position, tick, status, type, data in meta["metaEvents"]
+        ]
+        for name in MIDICache.TextFields:
+            setattr(track, name, [(tick, text.encode("latin-1"))
+                                  for tick, text in meta[name]])
+        for name in MIDICache.TupleFields:
+            setattr(track, name, [tuple(value) for value in meta[name]])
+        for name in MIDICache.ValueFields:
+            setattr(track, name, meta[name])
+
+    # rounds an offset up to a multiple of 8, so every column starts aligned
+    @staticmethod
+    def align(pos):
+        return (pos + 7) & ~7
@@ -0,0 +1,162 @@
+"""
+    Parses a whole corpus of MIDI files, spreading the files over a pool of processes
+
+    Every worker parses its files with MIDIFile and only sends back a small result for each file,
+    either a summary (a dictionary of numbers and names) or the NumPy arrays from to_arrays,
+    instead of the whole structure of tracks, events and notes
+    A file that cannot be parsed gives a result with its error, and does not stop the other files
+
+    To run it on one or more directories (or files) from the command line:
+        python3 corpus.py path/to/midi/files --workers 8 --output results.jsonl
+"""
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import json
+import os
+import time
+
+from main import MIDIFile
+
+# the file names that are parsed when a directory is given
+MIDIExtensions = (".mid", ".midi", ".smf")
+
+
+# finds the MIDI files in the given paths
+# directories are searched recursively, and files are used as they are
+def findFiles(paths):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, names in os.walk(path):
+                dirs.sort()
+                for name in sorted(names):
+                    if name.lower().endswith(MIDIExtensions):
+                        files.append(os.path.join(root, name))
+        else:
+            files.append(path)
+    return files
+
+
+# a short summary of a parsed file
+def summarise(midi):
+    return {
+        "format": midi.header.format,
+        "division": midi.header.division,
+        "tracks": len(midi.tracks),
+        "events": sum(len(track.events) for track in midi.tracks),
+        "notes": sum(len(track.notes) for track in midi.tracks),
+        "names": [track.name for track in midi.tracks if track.name != ""],
+        "tempo": midi.tempo,
+        "bpm": midi.bpm,
+        "timeSignatures": midi.timeSignatures(),
+        "keySignatures": midi.keySignatures(),
+        "minNote": min((track.minNote for track in midi.tracks), default=0),
+        "maxNote": max((track.maxNote for track in midi.tracks), default=0),
+    }
+
+
+# parses a single file in a worker
+# the result always has the path and the size of the file, and any warnings from the parser,
+# then either the summary (or arrays) or the error that stopped the file from being parsed
+def parseOne(filename, arrays=False):
+    result = {"path": filename, "size": 0, "warnings": []}
+    try:
+        result["size"] = os.path.getsize(filename)
+        midi = MIDIFile(filename, warn=result["warnings"].append)
+        if arrays:
+            result["arrays"] = midi.to_arrays()
+        else:
+            result["summary"] = summarise(midi)
+    except Exception as e:
+        result["error"] = type(e).__name__ + ": " + str(e)
+    return result
+
+
+# the results of parsing a corpus
+# results = the result of every file, in the same order as the files
+# elapsed = how many seconds it took to parse all of them
+class CorpusResult:
+
+    def __init__(self, results, elapsed):
+        self.results = results
+        self.elapsed = elapsed
+
+    # the results of the files that could not be parsed
+    def errors(self):
+        return [result for result in self.results if "error" in result]
+
+    def totalBytes(self):
+        return sum(result["size"] for result in self.results)
+
+    def filesPerSecond(self):
+        return len(self.results) / self.elapsed if self.elapsed else 0.0
+
+    def megabytesPerSecond(self):
+        return (self.totalBytes() / 1e6 /
+                self.elapsed if self.elapsed else 0.0)
+
+    def __repr__(self):
+        return ("Parsed " + str(len(self.results)) + " files (" +
+                str(len(self.errors())) + " errors) in " +
+                format(self.elapsed, ".2f") + "s: " +
+                format(self.filesPerSecond(), ".1f") + " files/s, " +
+                format(self.megabytesPerSecond(), ".2f") + " MB/s")
+
+
+# parses every MIDI file in the given paths (files or directories) with a pool of processes
+# workers = the number of processes, by default one per CPU
+# chunksize = how many files are sent to a worker at once, by default the files are split into
+# about four chunks per worker so the work stays balanced without sending every file on its own
+# arrays = True gives the arrays from to_arrays for every file instead of a summary
+def parseCorpus(paths, workers=None, chunksize=None, arrays=False):
+    files = findFiles(paths)
+    workers = workers or os.cpu_count() or 1
+    if chunksize is None:
+        chunksize = max(1, len(files) // (workers * 4))
+
+    start = time.perf_counter()
+    if workers == 1:
+        results = [parseOne(filename, arrays) for filename in files]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(
+                pool.map(parseOne,
+                         files, [arrays] * len(files),
+                         chunksize=chunksize))
+    return CorpusResult(results, time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Parse a corpus of MIDI files in parallel")
+    parser.add_argument("paths",
+                        nargs="+",
+                        help="MIDI files or directories to search for them")
+    parser.add_argument(
+        "-j",
+        "--workers",
+        type=int,
+        default=None,
+        help="number of worker processes (default: one per CPU)")
+    parser.add_argument("--chunksize",
+                        type=int,
+                        default=None,
+                        help="number of files sent to a worker at once")
+    parser.add_argument("-o",
+                        "--output",
+                        default=None,
+                        help="write the result of every file as JSON lines")
+    args = parser.parse_args()
+
+    corpus = parseCorpus(args.paths, args.workers, args.chunksize)
+    if args.output:
+        with open(args.output, "w") as f:
+            for result in corpus.results:
+                f.write(json.dumps(result) + "\n")
+    for result in corpus.errors():
+        print(result["path"] + ": " + result["error"])
+    print(corpus)
+
+
+if __name__ == "__main__":
+    main()
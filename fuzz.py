@@ -0,0 +1,267 @@
+"""
+    Parses broken MIDI files, to check that every way of parsing fails quickly with a MIDIError
+
+    Every case is a valid file (bach_846.mid, or a file from benchmark.generateMIDI) that is broken
+    in one way: flipped bytes, cut short, chunks with wrong or huge lengths, a huge number of tracks,
+    no End Of Track event, variable length values that never end, unknown chunks or random bytes
+    Every case is parsed from a buffer and with the original parser, both strict and lenient, lazily,
+    with iter_events and with a MIDIStreamDecoder fed a few bytes at a time, and the lenient results
+    are written back with toBytes. Anything other than a MIDIError, or a case that takes longer than
+    the timeout, is a failure, and so is a case where the parsers do not agree:
+        - the lenient parsers must write the same bytes back
+        - the strict parsers must fail with the same error, or both succeed
+        - iter_events and the stream decoder must give the same events, or fail with the same error
+          (the stream decoder can also stop at a limit, as it cannot know the size of the file)
+        - a file the strict parsers accept must be accepted by iter_events
+    The cases come from a fixed seed, so a failure can always be made again
+
+    To run 2000 cases, and keep the ones that failed:
+        python3 fuzz.py --cases 2000 --corpus failures
+"""
+import argparse
+import collections
+import os
+import random
+import signal
+import tempfile
+import time
+
+from benchmark import chunk, encodeValue, generateMIDI, metaEvent
+from main import MIDIError, MIDIFile, MIDIStreamDecoder, iter_events
+
+
+# raised by the timer when a case takes too long
+class FuzzTimeout(Exception):
+    pass
+
+
+# the ways a file is broken, every one gives the broken bytes of a valid file
+# the offset of the first track chunk is 14, as the header chunk of the seeds is 6 bytes long
+def flipBytes(rng, data):
+    data = bytearray(data)
+    for i in range(rng.randint(1, 8)):
+        data[rng.randrange(len(data))] = rng.randrange(256)
+    return bytes(data)
+
+
+def truncate(rng, data):
+    return data[:rng.randrange(len(data))]
+
+
+# the offsets of the ID of every chunk after the header
+def chunkOffsets(data):
+    offsets = []
+    pos = 14
+    while pos + 8 <= len(data):
+        offsets.append(pos)
+        pos += 8 + int.from_bytes(data[pos + 4:pos + 8], "big")
+    return offsets
+
+
+def chunkLength(rng, data):
+    pos = rng.choice(chunkOffsets(data)) + 4
+    length = rng.choice((0, 1, rng.randrange(1 << 16), 0x7FFFFFFF, 0xFFFFFFFF))
+    return data[:pos] + length.to_bytes(4, "big") + data[pos + 4:]
+
+
+def trackChunks(rng, data):
+    count = rng.choice((0, rng.randrange(1, 64), 0xFFFF))
+    return data[:10] + count.to_bytes(2, "big") + data[12:]
+
+
+def headerLength(rng, data):
+    length = rng.choice((0, 5, 7, 1 << 20, 0xFFFFFFFF))
+    return data[:4] + length.to_bytes(4, "big") + data[8:]
+
+
+# removes every End Of Track event (the lengths of the chunks are left as they are)
+def removeEndOfTrack(rng, data):
+    return data.replace(b"\xFF\x2F\x00", b"\x00\x00\x00")
+
+
+# a track made of a single variable length value that never ends
+def longValue(rng, data):
+    track = chunk(b"MTrk", b"\x80" * rng.randint(5, 64) + b"\x00")
+    return data + track
+
+
+# an event that says it is much longer than its track
+def longEvent(rng, data):
+    track = chunk(b"MTrk",
+                  encodeValue(0) + b"\xFF\x01" + encodeValue(1 << 27) + b"x")
+    return data + track
+
+
+def unknownChunk(rng, data):
+    pos = rng.choice(chunkOffsets(data))
+    extra = chunk(b"XFIH", bytes(rng.randrange(256) for i in range(64)))
+    return data[:pos] + extra + data[pos:]
+
+
+def garbageTrack(rng, data):
+    events = bytes(rng.randrange(256) for i in range(rng.randint(1, 256)))
+    return data + chunk(b"MTrk", events + metaEvent(0, 0x2F, b""))
+
+
+def garbage(rng, data):
+    return bytes(rng.randrange(256) for i in range(rng.randint(0, 64)))
+
+
+Mutations = (flipBytes, truncate, chunkLength, trackChunks, headerLength,
+             removeEndOfTrack, longValue, longEvent, unknownChunk,
+             garbageTrack, garbage)
+
+
+# the valid files the cases are made from
+def seeds():
+    files = [generateMIDI(tracks=2, notes=200)]
+    directory = os.path.dirname(os.path.abspath(__file__))
+    example = os.path.join(directory, "bach_846.mid")
+    if os.path.exists(example):
+        with open(example, "rb") as f:
+            files.append(f.read())
+    return files
+
+
+# parses a file in every way, only MIDIErrors are expected
+# gives the name of the error every way ended with ("ok" for none), and the ways that do not agree
+def parseCase(filename, data):
+    results = {}
+    outputs = {}
+
+    def attempt(name, parse):
+        try:
+            outputs[name] = parse()
+            results[name] = "ok"
+        except MIDIError as e:
+            results[name] = type(e).__name__
+
+    def ignore(message):
+        pass
+
+    def lenient(fromBuffer):
+        return MIDIFile(filename, fromBuffer, warn=ignore).toBytes()
+
+    def lazy():
+        midi = MIDIFile(filename, lazy=True, warn=ignore)
+        midi.decodeAll()
+        midi.tempo
+        return midi.toBytes()
+
+    # the events as tuples that can be compared
+    def events(found):
+        return [(track, tick, repr(event)) for track, tick, event in found]
+
+    def stream():
+        decoder = MIDIStreamDecoder(maxEventLength=1 << 20)
+        found = []
+        for pos in range(0, len(data), 97):
+            found += decoder.feed(data[pos:pos + 97])
+        decoder.close()
+        return events(found)
+
+    attempt("buffer", lambda: lenient(True))
+    attempt("file", lambda: lenient(False))
+    attempt("strict buffer",
+            lambda: MIDIFile(filename, warn=ignore, strict=True).toBytes())
+    attempt(
+        "strict file",
+        lambda: MIDIFile(filename, False, warn=ignore, strict=True).toBytes())
+    attempt("lazy", lazy)
+    attempt("iter_events", lambda: events(iter_events(filename)))
+    attempt("stream", stream)
+
+    differences = []
+    for first, second in (("buffer", "file"), ("buffer", "lazy"),
+                          ("strict buffer", "strict file"), ("iter_events",
+                                                             "stream")):
+        # the stream decoder cannot know the size of the file, so it can stop at a limit
+        # where the others find that a chunk is longer than the file
+        if second == "stream" and results[first] != "ok" and results[
+                second] == "MIDILimitError":
+            continue
+        if (results[first] != results[second]
+                or outputs.get(first) != outputs.get(second)):
+            differences.append(first + " (" + results[first] + ") and " +
+                               second + " (" + results[second] + ")")
+    if results["strict buffer"] == "ok" and results["iter_events"] != "ok":
+        differences.append("iter_events (" + results["iter_events"] +
+                           ") fails on a file the strict parsers accept")
+    return results, differences
+
+
+def timeout(signum, frame):
+    raise FuzzTimeout()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Parse broken MIDI files, and check they fail quickly")
+    parser.add_argument("-n",
+                        "--cases",
+                        type=int,
+                        default=500,
+                        help="number of broken files to parse")
+    parser.add_argument("--seed", type=int, default=0, help="random seed")
+    parser.add_argument("--timeout",
+                        type=float,
+                        default=5.0,
+                        help="seconds a case can take before it fails")
+    parser.add_argument("--corpus",
+                        default=None,
+                        help="directory where the failed cases are saved")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    files = seeds()
+    errors = collections.Counter()
+    failures = 0
+    slowest = (0.0, None)
+    signal.signal(signal.SIGALRM, timeout)
+
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, "case.mid")
+        for case in range(args.cases):
+            mutation = rng.choice(Mutations)
+            data = mutation(rng, rng.choice(files))
+            with open(filename, "wb") as f:
+                f.write(data)
+
+            start = time.perf_counter()
+            signal.setitimer(signal.ITIMER_REAL, args.timeout)
+            try:
+                results, differences = parseCase(filename, data)
+                problem = ("the parsers do not agree: " +
+                           "; ".join(differences)) if differences else None
+            except FuzzTimeout:
+                problem = "took longer than " + str(args.timeout) + " s"
+            except Exception as e:
+                problem = type(e).__name__ + ": " + str(e)
+            finally:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+            seconds = time.perf_counter() - start
+
+            name = "case" + str(case) + "_" + mutation.__name__
+            if seconds > slowest[0]:
+                slowest = (seconds, name)
+            if problem is None:
+                errors.update(results.values())
+                continue
+            failures += 1
+            print(name + ": " + problem)
+            if args.corpus:
+                os.makedirs(args.corpus, exist_ok=True)
+                with open(os.path.join(args.corpus, name + ".mid"), "wb") as f:
+                    f.write(data)
+
+    print(
+        str(args.cases) + " cases, " + str(failures) + " failed, slowest " +
+        str(slowest[1]) + " in " + format(slowest[0] * 1000, ".1f") + " ms")
+    for error, count in errors.most_common():
+        print("  " + error + ": " + str(count))
+    if failures:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,16 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import deque
 from enum import Enum
+import ast
+import heapq
+import io
+import json
+import logging
+import mmap
 import os
+import struct
+import time
 """
     This is a simple parser for a MIDI file that outputs a human readable text file of the instruction in the file
     It is an adaptation of the parser created by Javidx9 (OneLoneCoder), hence the credit of the logic of this parser is completely for him
@@ -18,47 +29,368 @@ import os
     These are all identified as classes, and objects of these classes will be used to create the structure of the MIDI file as we parse
 """
 
+# the parser does not print anything, anything it does not recognise is logged here instead
+logger = logging.getLogger("midipy")
+
+# the most bytes in a variable length value, the largest value in a MIDI file (0x0FFFFFFF) takes 4
+MaxValueBytes = 4
+
+
+# the error raised for a file that is not a valid MIDI file
+# it is a ValueError, and the kind of problem is given by the classes below
+class MIDIError(ValueError):
+    pass
+
+
+# the file does not start with a valid header chunk
+class MIDIHeaderError(MIDIError):
+    pass
+
+
+# a chunk is cut short, or says it is longer than the rest of the file
+class MIDIChunkError(MIDIError):
+    pass
+
+
+# an event is malformed or runs past the end of its track, or a track has no End Of Track event
+class MIDIEventError(MIDIError):
+    pass
+
+
+# the file goes over one of the limits that protect against hostile files, e.g. MIDIFile.MaxEvents
+class MIDILimitError(MIDIError):
+    pass
+
+
+# the default way to handle a problem in a file, which is to stop with the error
+def raiseError(error):
+    raise error
+
+
+# reading an integer (value) from a buffer, starting at the offset pos
+# this is the same variable length decoding as the readValue in parseFile, but it works on
+# integer indices into a buffer instead of reading the file one byte at a time
+# returns the value and the offset of the byte after it
+# raises MIDIEventError if the value is longer than MaxValueBytes
+def readValue(data, pos):
+    nValue = data[pos]
+    pos += 1
+    # check if MSB = 1
+    if nValue & 0x80:
+        # get the last 7 LSBs, and keep adding the next 7 bits while the MSB is set
+        nValue &= 0x7F
+        last = pos + MaxValueBytes - 1
+        while True:
+            nByte = data[pos]
+            pos += 1
+            nValue = (nValue << 7) | (nByte & 0x7F)
+            if not nByte & 0x80:
+                break
+            if pos >= last:
+                raise MIDIEventError("Variable length value longer than " +
+                                     str(MaxValueBytes) + " bytes")
+    return nValue, pos
+
+
+# writing an integer (value) as a variable length value into a bytearray, at the offset pos
+# the 7 bit groups are collected in one integer with the top bit set on all but the last one,
+# then written out from the most significant group
+# returns the offset of the byte after it
+def writeValue(out, pos, value):
+    if value < 0x80:
+        out[pos] = value
+        return pos + 1
+    groups = value & 0x7F
+    value >>= 7
+    while value:
+        groups = (groups << 8) | 0x80 | (value & 0x7F)
+        value >>= 7
+    while groups & 0x80:
+        out[pos] = groups & 0xFF
+        groups >>= 8
+        pos += 1
+    out[pos] = groups
+    return pos + 1
+
+
+# decodes the events of a single track from a buffer, from the offset pos up to the offset end
+# every event is yielded as a tuple (deltaTick, status, data1, data2, payload)
+#   - voice messages have their data bytes in data1 and data2 (data2 is 0 if there is only one)
+#   - meta events have status 0xFF, the meta type in data1, the length in data2 and the bytes in payload
+#   - system exclusive events have status 0xF0 or 0xF7, the length in data2 and the bytes in payload
+# payload is a slice of the buffer, so nothing is copied unless the caller asks for it
+# a status of 0 means a data byte was found when there was no running status to use
+# an event that runs past end raises MIDIEventError before it is yielded, so no byte after end is used
+def decodeTrack(data, pos, end):
+    previousState = 0
+
+    try:
+        while pos < end:
+            # the time difference between last note and current note is the delta
+            statusTimeDelta, pos = readValue(data, pos)
+            if pos >= end:
+                raise MIDIEventError(
+                    "The last event runs past the end of the track")
+
+            status = data[pos]
+            # if it begins with an instruction, the previous status is used again (running status)
+            # the instruction byte is not consumed, as it is the first data byte of this event
+            if status < 0x80:
+                status = previousState
+            else:
+                pos += 1
+
+            if status < 0x80:
+                yield (statusTimeDelta, 0, 0, 0, None)
+
+            elif status < 0xC0 or 0xE0 <= status < 0xF0:
+                # note off, note on, aftertouch, control change and pitch bend have two data bytes
+                previousState = status
+                if pos + 2 > end:
+                    raise MIDIEventError(
+                        "The last event runs past the end of the track")
+                yield (statusTimeDelta, status, data[pos], data[pos + 1], None)
+                pos += 2
+
+            elif status < 0xF0:
+                # program change and channel pressure have one data byte
+                previousState = status
+                if pos + 1 > end:
+                    raise MIDIEventError(
+                        "The last event runs past the end of the track")
+                yield (statusTimeDelta, status, data[pos], 0, None)
+                pos += 1
+
+            else:
+                previousState = 0
+
+                if status == 0xFF:
+                    if pos >= end:
+                        raise MIDIEventError(
+                            "The last event runs past the end of the track")
+                    type = data[pos]
+                    length, pos = readValue(data, pos + 1)
+                    if pos + length > end:
+                        raise MIDIEventError(
+                            "Meta event runs past the end of the track")
+                    yield (statusTimeDelta, status, type, length,
+                           data[pos:pos + length])
+                    pos += length
+                    if type == 0x2F:
+                        return
+
+                elif status == 0xF0 or status == 0xF7:
+                    length, pos = readValue(data, pos)
+                    if pos + length > end:
+                        raise MIDIEventError(
+                            "System exclusive event runs past the end of the "
+                            "track")
+                    yield (statusTimeDelta, status, 0, length,
+                           data[pos:pos + length])
+                    pos += length
+
+                else:
+                    yield (statusTimeDelta, status, 0, 0, None)
+    except IndexError:
+        raise MIDIEventError("The track is cut short by the end of the file")
+
+    raise MIDIEventError("The track has no End Of Track event")
+
+
+# finds the track chunks in a buffer, after the header, chunks that are not tracks are skipped
+# every track is yielded as a tuple (chunk, trackID, start, end), where chunk is the index of the
+# track, and start and end are the offsets of the first byte of the track's events and the byte
+# after the last one
+# problem = called with a MIDIChunkError for a chunk that is cut short, or says it is longer than
+# the file, by default it is raised, otherwise the tracks that are there are used
+def findTracks(data, header, problem=raiseError):
+    pos = 8 + header.headerLength
+    chunk = 0
+    while chunk < header.trackChunks:
+        if pos + 8 > len(data):
+            problem(
+                MIDIChunkError("The file ends after " + str(chunk) + " of " +
+                               str(header.trackChunks) + " tracks"))
+            return
+        trackID = bytes(data[pos:pos + 4])
+        trackLength = int.from_bytes(data[pos + 4:pos + 8], "big")
+        start = pos + 8
+        end = start + trackLength
+        if end > len(data):
+            problem(
+                MIDIChunkError("Chunk " + str(trackID) + " is " +
+                               str(trackLength) +
+                               " bytes long, but the file ends after " +
+                               str(len(data) - start)))
+            end = len(data)
+        if trackID == b"MTrk":
+            yield chunk, trackID, start, end
+            chunk += 1
+        pos = end
+
 
 # This recognises the events in a MIDI track
 # The type of events inclde: playing a note, stopping a note, or another system executive instruction
 class MIDIEvent:
+    __slots__ = ("type", "key", "velocity", "deltaTick", "channel", "status")
 
     # defining an enumeration on the type of MIDI events
     class Type(Enum):
         noteOFF = 0
         noteON = 1
         other = 2
+        controlChange = 3
+        programChange = 4
+        pitchBend = 5
+        aftertouch = 6
+        channelPressure = 7
+
+    # the type of every voice message, by the top 4 bits of its status byte (0x8 to 0xE)
+    MessageTypes = (None, ) * 8 + (Type.noteOFF, Type.noteON, Type.aftertouch,
+                                   Type.controlChange, Type.programChange,
+                                   Type.channelPressure, Type.pitchBend)
+    MessageTypeValues = tuple(type.value if type else 0
+                              for type in MessageTypes)
 
     # A MIDI event has the following features
     # Type = The type of event (from the above enumeration)
-    # Key = The note being played
-    # velocity = the speed of the note in the track
+    # Key = The note being played, or the first data byte of other messages
+    # velocity = the speed of the note in the track, or the second data byte of other messages
     # deltaTick = the time difference between this and the previous event
-    def __init__(self, note, noteID=0, vel=0, delta=0):
+    # channel = the channel the event is sent on
+    # status = the status byte it had in the file, if it was read from one (e.g. a note off can be
+    # a note on with a velocity of 0)
+    # the data of the other messages can also be read with the properties below
+    def __init__(self, note, noteID=0, vel=0, delta=0, channel=0, status=None):
         self.type = note
         self.key = noteID
         self.velocity = vel
         self.deltaTick = delta
+        self.channel = channel
+        self.status = status
 
     def __repr__(self):
         return ("\nEvent Type: " + str(self.type) + " Key: " + str(self.key) +
                 " Velocity: " + str(self.velocity) + " delta tick: " +
                 str(self.deltaTick))
 
+    # the controller and its value, for a control change
+    @property
+    def controller(self):
+        return self.key
+
+    @property
+    def value(self):
+        return self.velocity
+
+    # the program, for a program change
+    @property
+    def program(self):
+        return self.key
+
+    # the pressure, for aftertouch (on the key) and channel pressure (on the whole channel)
+    @property
+    def pressure(self):
+        if self.type is MIDIEvent.Type.channelPressure:
+            return self.key
+        return self.velocity
+
+    # the pitch bend, from -8192 to 8191 with 0 in the middle
+    @property
+    def pitchBend(self):
+        return ((self.velocity << 7) | self.key) - 8192
+
+    # creates the event for a voice message decoded by decodeTrack
+    @classmethod
+    def fromMessage(cls, status, data1, data2, delta):
+        type = MIDIEvent.MessageTypes[status >> 4]
+        # if the veloctiy is 0, that means the note isnt being played
+        if type is MIDIEvent.Type.noteON and not data2:
+            type = MIDIEvent.Type.noteOFF
+        return cls(type, data1, data2, delta, status & 0x0F, status)
+
+    # the MIDIEvent.Type value of a voice message, without creating the event
+    @staticmethod
+    def typeValue(status, data2):
+        if status >> 4 == 0x9 and not data2:
+            return MIDIEvent.Type.noteOFF.value
+        return MIDIEvent.MessageTypeValues[status >> 4]
+
+
+# recognises a meta event or a system exclusive event in a MIDI track
+# these are not kept in the track's events, but are given by iter_events
+class MIDIMetaEvent:
+
+    # A meta event has the following features
+    # status = 0xFF for a meta event, 0xF0 or 0xF7 for a system exclusive event
+    # type = the type of meta event (see MIDIFile.MetaEventName), 0 for system exclusive events
+    # data = the bytes of the event
+    # deltaTick = the time difference between this and the previous event
+    def __init__(self, status, type, data, delta=0):
+        self.status = status
+        self.type = type
+        self.data = data
+        self.deltaTick = delta
+
+    def __repr__(self):
+        return ("\nMeta Event Status: " + str(self.status) + " Type: " +
+                str(self.type) + " Data: " + str(self.data) + " delta tick: " +
+                str(self.deltaTick))
+
+
+# the header of a MIDI file
+class MIDIHeader:
+
+    # The header has the following features
+    # fileID = the ID of the header chunk, b'MThd' for a MIDI file
+    # headerLength = the length of the header chunk
+    # format = 0 for a single track, 1 for tracks played together, 2 for independent tracks
+    # trackChunks = the number of tracks in the file
+    # division = the number of ticks in a quarter note (or SMPTE timing if the top bit is set)
+    def __init__(self, fileID, headerLength, format, trackChunks, division):
+        self.fileID = fileID
+        self.headerLength = headerLength
+        self.format = format
+        self.trackChunks = trackChunks
+        self.division = division
+
+    def __repr__(self):
+        return ("\nFile ID: " + str(self.fileID) + " header length: " +
+                str(self.headerLength) + " format: " + str(self.format) +
+                " Number of Tracks: " + str(self.trackChunks) +
+                " number of divisions: " + str(self.division))
+
+    # reads the header from the start of a buffer
+    # raises MIDIHeaderError if the buffer does not start with a header chunk
+    @classmethod
+    def fromBuffer(cls, data):
+        if len(data) < 14 or data[0:4] != b"MThd":
+            raise MIDIHeaderError("The file does not start with a MThd chunk")
+        if int.from_bytes(data[4:8], "big") < 6:
+            raise MIDIHeaderError("The header chunk is shorter than 6 bytes")
+        return cls(bytes(data[0:4]), int.from_bytes(data[4:8], "big"),
+                   int.from_bytes(data[8:10], "big"),
+                   int.from_bytes(data[10:12], "big"),
+                   int.from_bytes(data[12:14], "big"))
+
 
 # recognises a note in a track in the MIDI file
 # the features of the note is identified by noting when a note On and note Off event arrive
 class MIDINote:
+    __slots__ = ("key", "velocity", "startTime", "duration", "channel")
+
     # a note in MIDI has the following features
     # key = The note
     # velocity = the speed of the note
     # startTime = when the note begins
     # duration = how long the note is played for
-    def __init__(self, k, vel, start, dur):
+    # channel = the channel the note is played on
+    def __init__(self, k, vel, start, dur, channel=0):
         self.key = k
         self.velocity = vel
         self.startTime = start
         self.duration = dur
+        self.channel = channel
 
     def __repr__(self):
         return ("\n\t Key: " + str(self.key) + " Velocity: " +
@@ -66,33 +398,552 @@ class MIDINote:
                 " duration: " + str(self.duration))
 
 
+# a table of numbers stored column by column, with one row for every event or note in a track
+# the parser appends to the columns as it decodes, so the table can be turned into a NumPy array
+# without going through the MIDIEvent and MIDINote objects
+# fields = the name and array type code of every column, e.g. ("tick", "Q")
+class MIDITable:
+
+    def __init__(self, fields):
+        self.fields = fields
+        self.columns = {name: array(code) for name, code in fields}
+
+    def __len__(self):
+        return len(self.columns[self.fields[0][0]])
+
+    # creates a NumPy structured array with one field per column
+    def toArray(self):
+        import numpy as np
+
+        table = np.empty(len(self),
+                         dtype=[(name, code) for name, code in self.fields])
+        for name, code in self.fields:
+            table[name] = np.frombuffer(self.columns[name], dtype=code)
+        return table
+
+
+# converts ticks to seconds, following every tempo change in a file
+# with the usual division (ticks per quarter note), the time of a tick depends on the tempo when it
+# is played, so the file is split into segments at every tempo change, and the time at the start
+# of every segment is worked out once
+# with SMPTE division (the top bit is set), ticks are a fixed fraction of a second and the tempo
+# does not matter
+# ticks = the tick where every segment starts
+# seconds = the time in seconds where every segment starts
+# tempos = the tempo of every segment, in microseconds per quarter note
+# secondsPerTick = how long a tick is in every segment
+class MIDITempoMap:
+
+    # the tempo until the first Set Tempo event (120 bpm)
+    DefaultTempo = 500000
+
+    # division = the division from the header of the file
+    # tempoChanges = the (tick, tempo) of every Set Tempo event, from every track
+    def __init__(self, division, tempoChanges=()):
+        self.division = division
+        self.ticks = array("Q", [0])
+        self.seconds = array("d", [0.0])
+        self.tempos = array("I", [MIDITempoMap.DefaultTempo])
+        self.secondsPerTick = array("d", [0.0])
+        self.numpyArrays = None
+
+        if division & 0x8000:
+            # the high byte is the negative number of frames per second, and the low byte is the
+            # number of ticks in a frame, 29 frames per second means 29.97 (drop frame)
+            fps = 256 - (division >> 8)
+            if fps == 29:
+                fps = 30000 / 1001
+            if division & 0xFF:
+                self.secondsPerTick[0] = 1 / (fps * (division & 0xFF))
+            return
+
+        if division:
+            self.secondsPerTick[0] = MIDITempoMap.DefaultTempo / (division *
+                                                                  1000000)
+
+        # tempo changes at the same tick are kept in the order of the tracks, so the last one is used
+        for tick, tempo in sorted(tempoChanges, key=lambda change: change[0]):
+            scale = tempo / (division * 1000000) if division else 0.0
+            if tick == self.ticks[-1]:
+                self.tempos[-1] = tempo
+                self.secondsPerTick[-1] = scale
+            else:
+                self.seconds.append(self.seconds[-1] +
+                                    (tick - self.ticks[-1]) *
+                                    self.secondsPerTick[-1])
+                self.ticks.append(tick)
+                self.tempos.append(tempo)
+                self.secondsPerTick.append(scale)
+
+    def __len__(self):
+        return len(self.ticks)
+
+    # the tempo (microseconds per quarter note) at a tick
+    def tempoAt(self, tick):
+        return self.tempos[bisect_right(self.ticks, tick) - 1]
+
+    # the time in seconds of a single tick
+    def tickToSeconds(self, tick):
+        i = bisect_right(self.ticks, tick) - 1
+        return self.seconds[i] + (tick -
+                                  self.ticks[i]) * self.secondsPerTick[i]
+
+    # the time in seconds of every tick in a NumPy array (or anything NumPy can turn into one)
+    # e.g. the "start" field of the notes from to_arrays
+    def ticksToSeconds(self, ticks):
+        import numpy as np
+
+        if self.numpyArrays is None:
+            self.numpyArrays = (np.frombuffer(self.ticks, dtype="Q"),
+                                np.frombuffer(self.seconds, dtype="d"),
+                                np.frombuffer(self.secondsPerTick, dtype="d"))
+        segmentTicks, segmentSeconds, secondsPerTick = self.numpyArrays
+
+        ticks = np.asarray(ticks)
+        i = np.searchsorted(segmentTicks, ticks, side="right") - 1
+        return segmentSeconds[i] + (ticks -
+                                    segmentTicks[i]) * secondsPerTick[i]
+
+
+# a node of the interval tree in MIDINoteIndex
+# center = a tick, every note in the node is playing at it
+# ids = the notes in the node, in the order they start (every note in a leaf, for a leaf)
+# starts = the start of every note in ids, to search with bisect
+# byEnd = the notes in the node, in the order they end, the last one first
+# ends = the negative end of every note in byEnd, so it is in ascending order for bisect
+# left, right = the nodes with the notes that end before center, and start after it
+class MIDIIntervalNode:
+    __slots__ = ("center", "ids", "starts", "byEnd", "ends", "left", "right")
+
+    def __init__(self, center, ids, starts, byEnd=None, ends=None):
+        self.center = center
+        self.ids = ids
+        self.starts = starts
+        self.byEnd = byEnd
+        self.ends = ends
+        self.left = None
+        self.right = None
+
+
+# finds the notes of every track that are playing at a tick, or in a range of ticks
+# every note gets an id, in the order the notes start (by track and by their order in the track
+# for notes that start at the same tick), and the index keeps its start, end, key, track and row
+# in the note table of its track
+# notes starting in a range are found with bisect on the sorted starts, and notes playing in a
+# range are found with a centered interval tree, so a query takes O(log n + k) for k notes
+# a note is playing from its start until its end (start + duration), not at the end itself, so
+# notes with no duration are never playing (but they are found by startingBetween)
+class MIDINoteIndex:
+
+    # a node with this many notes or fewer is not split, its notes are just checked one by one
+    LeafSize = 32
+
+    # tracks = the tracks of a parsed file (see MIDIFile.tracks)
+    def __init__(self, tracks):
+        notes = []
+        for trackIndex, track in enumerate(tracks):
+            columns = track.noteTable.columns
+            notes.extend(
+                zip(columns["start"], columns["duration"],
+                    range(len(track.noteTable)), columns["key"],
+                    [trackIndex] * len(track.noteTable)))
+        notes.sort(key=lambda note: (note[0], note[4], note[2]))
+
+        self.starts = array("Q", [note[0] for note in notes])
+        self.ends = array("Q", [note[0] + note[1] for note in notes])
+        self.keys = array("B", [note[3] for note in notes])
+        self.tracks = array("I", [note[4] for note in notes])
+        self.rows = array("I", [note[2] for note in notes])
+        self.sortedEnds = None
+        self.root = self.buildTree(
+            array("I", [i for i, note in enumerate(notes) if note[1]]))
+        # every track with the start column of its note table and its length, see isCurrent
+        self.sources = [(track, track.noteTable.columns["start"],
+                         len(track.noteTable)) for track in tracks]
+
+    def __len__(self):
+        return len(self.starts)
+
+    # checks that the index was built from these tracks, with the note tables they have now
+    # a track that was added or removed, or whose notes were paired again (e.g. by setEvents), or
+    # notes that were added or removed, make the index out of date
+    # notes changed in place in the note tables are not noticed, see MIDIFile.indexNotes
+    def isCurrent(self, tracks):
+        return len(tracks) == len(self.sources) and all(
+            track is source and track.noteTable.columns["start"] is column
+            and len(track.noteTable) == length
+            for track, (source, column, length) in zip(tracks, self.sources))
+
+    # builds the interval tree for the notes in ids, which are in the order they start
+    # the center of every node is the start of its middle note, so the tree stays balanced
+    def buildTree(self, ids):
+        starts = self.starts
+        ends = self.ends
+        root = None
+        pending = [(ids, None, False)]
+        while pending:
+            ids, parent, isRight = pending.pop()
+            if len(ids) <= MIDINoteIndex.LeafSize:
+                node = MIDIIntervalNode(None, ids,
+                                        array("Q", [starts[i] for i in ids]))
+            else:
+                center = starts[ids[len(ids) // 2]]
+                here = array("I")
+                left = array("I")
+                right = array("I")
+                for i in ids:
+                    if ends[i] <= center:
+                        left.append(i)
+                    elif starts[i] > center:
+                        right.append(i)
+                    else:
+                        here.append(i)
+                byEnd = array("I", sorted(here, key=lambda i: -ends[i]))
+                node = MIDIIntervalNode(center, here,
+                                        array("Q", [starts[i] for i in here]),
+                                        byEnd,
+                                        array("q", [-ends[i] for i in byEnd]))
+                if left:
+                    pending.append((left, node, False))
+                if right:
+                    pending.append((right, node, True))
+
+            if parent is None:
+                root = node
+            elif isRight:
+                parent.right = node
+            else:
+                parent.left = node
+        return root
+
+    # the ids of the notes playing at any tick from startTick up to (not including) endTick,
+    # in the order they start
+    # minKey, maxKey = only the notes with a key in this range (both included)
+    def between(self, startTick, endTick, minKey=0, maxKey=127):
+        found = []
+        pending = [self.root] if self.root is not None else []
+        while pending:
+            node = pending.pop()
+            if node.center is None:
+                ends = self.ends
+                for i in node.ids[:bisect_left(node.starts, endTick)]:
+                    if ends[i] > startTick:
+                        found.append(i)
+            elif endTick <= node.center:
+                # the range is before the center, the notes here end after it
+                found.extend(node.ids[:bisect_left(node.starts, endTick)])
+                if node.left is not None:
+                    pending.append(node.left)
+            elif startTick > node.center:
+                # the range is after the center, the notes here start before it
+                found.extend(node.byEnd[:bisect_left(node.ends, -startTick)])
+                if node.right is not None:
+                    pending.append(node.right)
+            else:
+                found.extend(node.ids)
+                if node.left is not None:
+                    pending.append(node.left)
+                if node.right is not None:
+                    pending.append(node.right)
+
+        if minKey > 0 or maxKey < 127:
+            keys = self.keys
+            found = [i for i in found if minKey <= keys[i] <= maxKey]
+        # ids are in the order the notes start
+        found.sort()
+        return found
+
+    # the ids of the notes playing at a tick
+    def at(self, tick, minKey=0, maxKey=127):
+        return self.between(tick, tick + 1, minKey, maxKey)
+
+    # the ids of the notes that start from startTick up to (not including) endTick
+    def startingBetween(self, startTick, endTick, minKey=0, maxKey=127):
+        found = range(bisect_left(self.starts, startTick),
+                      bisect_left(self.starts, endTick))
+        if minKey > 0 or maxKey < 127:
+            keys = self.keys
+            return [i for i in found if minKey <= keys[i] <= maxKey]
+        return list(found)
+
+    # the ids of the notes playing in every (startTick, endTick) range
+    def betweenMany(self, ranges, minKey=0, maxKey=127):
+        return [
+            self.between(startTick, endTick, minKey, maxKey)
+            for startTick, endTick in ranges
+        ]
+
+    # the number of notes playing at every tick in a NumPy array (or anything NumPy can turn into
+    # one), without finding the notes themselves
+    def countsAt(self, ticks):
+        import numpy as np
+
+        if self.sortedEnds is None:
+            self.sortedEnds = np.sort(np.frombuffer(self.ends, dtype="Q"))
+        ticks = np.asarray(ticks, dtype="Q")
+        return (np.searchsorted(
+            np.frombuffer(self.starts, dtype="Q"), ticks, side="right") -
+                np.searchsorted(self.sortedEnds, ticks, side="right"))
+
+
+# writes many small pieces of text to a file-like object, a batch at a time
+# this keeps the number of writes low, without holding the whole text in memory
+class MIDIDumpWriter:
+
+    def __init__(self, f, batch=4096):
+        self.f = f
+        self.batch = batch
+        self.pending = []
+
+    def write(self, text):
+        self.pending.append(text)
+        if len(self.pending) >= self.batch:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            self.f.write("".join(self.pending))
+            self.pending = []
+
+
+# collects how long every phase of a parse takes, and how much the parse found
+# pass one to MIDIFile (profile=...) to fill it in, every parse adds to it, so one profile can
+# follow a single file or a whole corpus. Parsing without a profile does not time anything
+# times = the seconds spent in every phase: "header", "decode", "notes" (pairing) and "tempo"
+# counters = the number of files, bytes, tracks, events and notes parsed
+class MIDIProfile:
+
+    Phases = ("header", "decode", "notes", "tempo")
+
+    def __init__(self):
+        self.times = dict.fromkeys(MIDIProfile.Phases, 0.0)
+        self.counters = dict.fromkeys(
+            ("files", "bytes", "tracks", "events", "notes"), 0)
+        self.last = 0.0
+
+    # starts timing the first phase
+    def start(self):
+        self.last = time.perf_counter()
+
+    # ends a phase, and starts timing the next one
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.times[phase] = self.times.get(phase, 0.0) + now - self.last
+        self.last = now
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    # counts what a parsed file holds
+    # size = the number of bytes in the file
+    def countFile(self, midi, size):
+        self.count("files")
+        self.count("bytes", size)
+        self.count("tracks", len(midi.tracks))
+        self.count("events",
+                   sum(len(track.eventTable) for track in midi.tracks))
+        self.count("notes", sum(len(track.noteTable) for track in midi.tracks))
+
+    def total(self):
+        return sum(self.times.values())
+
+    # the number of events decoded every second, over all the phases
+    def eventsPerSecond(self):
+        total = self.total()
+        return self.counters["events"] / total if total else 0.0
+
+    def __repr__(self):
+        return ("\n".join(phase + ": " + format(seconds * 1000, ".3f") + " ms"
+                          for phase, seconds in self.times.items()) + "\n" +
+                ", ".join(name + ": " + str(n)
+                          for name, n in self.counters.items()))
+
+
+# a list of the events or notes of a track, read from its event or note table
+# an event (or note) is only created when it is used, so the track itself only keeps the table
+# table = the MIDITable to read from
+# make = creates an event or note from the values in one row
+# names = the columns passed to make, in order
+class MIDIRowList:
+
+    def __init__(self, table, make, names):
+        self.table = table
+        self.make = make
+        self.names = names
+
+    def __len__(self):
+        return len(self.table)
+
+    def __iter__(self):
+        columns = self.table.columns
+        return map(self.make, *[columns[name] for name in self.names])
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        columns = self.table.columns
+        return self.make(*[columns[name][i] for name in self.names])
+
+    def __repr__(self):
+        return repr(list(self))
+
+
 # recognises a track in the MIDI file
-# a track has a minimum and maximum note, which is initialised is 64 as a base value
 class MIDITrack:
-    maxNote = 64
-    minNote = 64
+
+    # the columns kept for the events and the notes of a track
+    # events: the delta tick, the absolute tick, the type (MIDIEvent.Type value), the channel,
+    # the key, the velocity (the two data bytes of the message) and the status byte of the message
+    # notes: the key, the velocity, when the note starts, how long it is played for and the channel
+    EventFields = (("deltaTick", "I"), ("tick", "Q"), ("type", "B"),
+                   ("channel", "B"), ("key", "B"), ("velocity",
+                                                    "B"), ("status", "B"))
+    NoteFields = (("key", "B"), ("velocity", "B"), ("start", "Q"),
+                  ("duration", "Q"), ("channel", "B"))
 
     # The features in a note are as follows:
     # name = a name given to a track, if any
     # instrument = an instrument specified for a track, if any
-    # events = the list of events in the note
-    # notes = the list of notes and the duration
+    # events = the list of events in the note (read from the event table)
+    # notes = the list of notes and the duration (read from the note table)
+    # minNote, maxNote = the lowest and highest note in the track, which is initialised is 64 as a base value
+    # eventTable, noteTable = the events and notes as columns of numbers (see MIDITable)
+    # tempoChanges = the (tick, tempo) of every Set Tempo event in the track
+    # trackID, trackLength = the ID and length of the track chunk in the file
+    # the rest of the meta events in the track are kept as they are found, the ones that can
+    # happen many times as lists of tuples starting with the tick they are at:
+    # copyright = the copyright notice, if any
+    # texts, lyrics, markers, cuePoints = (tick, text) for every event of that kind
+    # timeSignatures = (tick, numerator, denominator, clocks per metronome tick, 1/32 notes per 24 clocks)
+    # keySignatures = (tick, sharps (negative for flats), 1 for a minor key)
+    # smpteOffset = (hours, minutes, seconds, frames, fractional frames), if any
+    # sequenceNumber, channelPrefix, port = the value of that event, if any
+    # sequencerSpecific = (tick, data) for every sequencer specific event
+    # systemExclusive = (tick, status, data) for every system exclusive event
+    # metaEvents = (position, tick, status, type, data) for every meta and system exclusive event
+    # in the order they are in the track, where position is the number of events in the event table
+    # before it (type is 0 for system exclusive events), so the track can be written back as it was
     def __init__(self):
         self.name = ""
         self.instrument = ""
-        self.events = []
-        self.notes = []
+        self.minNote = 64
+        self.maxNote = 64
+        self.eventTable = MIDITable(MIDITrack.EventFields)
+        self.noteTable = MIDITable(MIDITrack.NoteFields)
+        self.events = MIDIRowList(self.eventTable, MIDIEvent.fromMessage,
+                                  ("status", "key", "velocity", "deltaTick"))
+        self.notes = MIDIRowList(
+            self.noteTable, MIDINote,
+            ("key", "velocity", "start", "duration", "channel"))
+        self.tempoChanges = []
+        self.trackID = b"MTrk"
+        self.trackLength = 0
+        self.copyright = None
+        self.texts = []
+        self.lyrics = []
+        self.markers = []
+        self.cuePoints = []
+        self.timeSignatures = []
+        self.keySignatures = []
+        self.smpteOffset = None
+        self.sequenceNumber = None
+        self.channelPrefix = None
+        self.port = None
+        self.sequencerSpecific = []
+        self.systemExclusive = []
+        self.metaEvents = []
+
+    # a track that is only decoded the first time anything in it is used (see MIDIFile.parseLazy)
+    # only the ID and length of the chunk are known until then
+    # decoder = the function that fills in the track
+    @classmethod
+    def lazy(cls, trackID, trackLength, decoder):
+        track = cls.__new__(cls)
+        track.trackID = trackID
+        track.trackLength = trackLength
+        track.decoder = decoder
+        return track
+
+    # decodes the track, if it is lazy and has not been decoded yet
+    # anything set on the track before it was decoded (e.g. with setName) is kept, instead of what
+    # the decoder finds
+    # if the decoder raises (e.g. a strict parse of a broken track), the track is left lazy again,
+    # so it is never used half decoded, and the next use raises the same error
+    def decode(self):
+        decoder = self.__dict__.pop("decoder", None)
+        if decoder is not None:
+            # the ID and length of the chunk, and anything set since
+            assigned = dict(self.__dict__)
+            MIDITrack.__init__(self)
+            try:
+                decoder(self)
+            except BaseException:
+                self.__dict__.clear()
+                self.__dict__.update(assigned)
+                self.decoder = decoder
+                raise
+            self.__dict__.update(assigned)
+
+    # only called for the fields of a lazy track that has not been decoded yet
+    def __getattr__(self, name):
+        if "decoder" not in self.__dict__:
+            raise AttributeError(name)
+        self.decode()
+        return getattr(self, name)
 
     def __repr__(self):
-        temp = (("\nTrack Name: " + str(self.name)) +
-                ("\nTrack Instrument: " + str(self.instrument)) +
-                ("\nTrack Events:"))
+        f = io.StringIO()
+        out = MIDIDumpWriter(f)
+        self.dumpText(out)
+        out.flush()
+        return f.getvalue()
+
+    # writes the name, instrument, events and notes of the track as text to a MIDIDumpWriter
+    def dumpText(self, out):
+        out.write("\nTrack Name: " + str(self.name))
+        out.write("\nTrack Instrument: " + str(self.instrument))
+        out.write("\nTrack Events:")
         for eve in self.events:
-            temp = temp + repr(eve)
-        temp = temp + ("\nTrack Notes:")
+            out.write(repr(eve))
+        out.write("\nTrack Notes:")
         for n in self.notes:
-            temp = temp + repr(n)
-        return temp
+            out.write(repr(n))
+
+    # writes the track, its events and its notes as JSON lines to a MIDIDumpWriter
+    # index = the index of the track in the file
+    def dumpJSON(self, out, index):
+        out.write(
+            json.dumps({
+                "kind": "track",
+                "track": index,
+                "trackID": self.trackID.decode("latin-1"),
+                "trackLength": self.trackLength,
+                "name": self.name,
+                "instrument": self.instrument,
+            }) + "\n")
+
+        typeNames = {
+            eventType.value: eventType.name
+            for eventType in MIDIEvent.Type
+        }
+        events = self.eventTable.columns
+        for deltaTick, tick, type, channel, key, velocity in zip(
+                events["deltaTick"], events["tick"], events["type"],
+                events["channel"], events["key"], events["velocity"]):
+            out.write('{"kind": "event", "track": %d, "tick": %d, '
+                      '"deltaTick": %d, "type": "%s", "channel": %d, '
+                      '"key": %d, "velocity": %d}\n' %
+                      (index, tick, deltaTick, typeNames[type], channel, key,
+                       velocity))
+
+        notes = self.noteTable.columns
+        for key, velocity, start, duration, channel in zip(
+                notes["key"], notes["velocity"], notes["start"],
+                notes["duration"], notes["channel"]):
+            out.write('{"kind": "note", "track": %d, "start": %d, '
+                      '"duration": %d, "channel": %d, "key": %d, '
+                      '"velocity": %d}\n' %
+                      (index, start, duration, channel, key, velocity))
 
     def setName(self, name):
         self.name = name
@@ -100,8 +951,247 @@ class MIDITrack:
     def setInstrument(self, inst):
         self.instrument = inst
 
+    # replaces the events of the track with a list of MIDIEvents (voice messages), and pairs the
+    # notes again from them
+    # the event table is made again from the events, with the tick of every event following from
+    # the delta ticks, and the meta events stay at the same positions in the event table
     def setEvents(self, eve):
-        self.events = eve
+        for name, code in MIDITrack.EventFields:
+            self.eventTable.columns[name] = array(code)
+        tick = 0
+        for event in eve:
+            if event.type not in MIDIEvent.MessageTypes:
+                raise ValueError("Event of type " + str(event.type) +
+                                 " is not a voice message")
+            tick += event.deltaTick
+            # the status byte the event was read with is kept, unless its type or channel changed
+            status = event.status
+            if (status is None
+                    or status & 0x0F != event.channel or MIDIEvent.typeValue(
+                        status, event.velocity) != event.type.value):
+                status = (MIDIEvent.MessageTypes.index(event.type) << 4
+                          | event.channel)
+            self.addMessage(status, event.key, event.velocity, event.deltaTick,
+                            tick)
+
+        for name, code in MIDITrack.NoteFields:
+            self.noteTable.columns[name] = array(code)
+        self.minNote = 64
+        self.maxNote = 64
+        MIDIFile.buildTrackNotes(self)
+
+    # adds a voice message to the event table
+    # tick = the absolute tick of the message
+    def addMessage(self, status, data1, data2, delta, tick):
+        columns = self.eventTable.columns
+        columns["deltaTick"].append(delta)
+        columns["tick"].append(tick)
+        columns["type"].append(MIDIEvent.typeValue(status, data2))
+        columns["channel"].append(status & 0x0F)
+        columns["key"].append(data1)
+        columns["velocity"].append(data2)
+        columns["status"].append(status)
+
+    def addSystemExclusive(self, tick, status, data):
+        self.systemExclusive.append((tick, status, data))
+        self.metaEvents.append((len(self.eventTable), tick, status, 0, data))
+
+    # the meta information of the track that is written as meta events (see __init__)
+    MetaFields = ("name", "instrument", "copyright", "texts", "lyrics",
+                  "markers", "cuePoints", "timeSignatures", "keySignatures",
+                  "smpteOffset", "sequenceNumber", "channelPrefix", "port",
+                  "sequencerSpecific", "systemExclusive", "tempoChanges")
+
+    # the types of the meta events that collectMetaEvents makes from the meta information
+    MetaFieldTypes = (0x00, 0x01, 0x02, 0x03, 0x04, 0x05, 0x06, 0x07, 0x20,
+                      0x21, 0x51, 0x54, 0x58, 0x59, 0x7F)
+
+    # the meta events to write for the track
+    # these are the metaEvents found in the file, unless the meta information of the track (e.g. its
+    # name) was changed since, then they are made again from it with collectMetaEvents, and only
+    # the End Of Track event and the meta events the parser does not recognise are kept
+    # a track that was not parsed from a file (so metaEvents is empty) uses collectMetaEvents
+    def writtenMetaEvents(self):
+        if not self.metaEvents:
+            return self.collectMetaEvents()
+
+        # the meta information that the meta events found in the file give
+        recorded = MIDITrack()
+        parser = MIDIFile(warn=lambda message: None)
+        for position, tick, status, type, data in self.metaEvents:
+            if status == 0xFF:
+                parser.parseMeta(recorded, type, data, tick)
+            else:
+                recorded.addSystemExclusive(tick, status, data)
+        if all(
+                getattr(recorded, name) == getattr(self, name)
+                for name in MIDITrack.MetaFields):
+            return self.metaEvents
+
+        kept = [
+            event for event in self.metaEvents
+            if event[2] == 0xFF and event[3] not in MIDITrack.MetaFieldTypes
+        ]
+        return sorted(self.collectMetaEvents() + kept,
+                      key=lambda event: (event[0], event[1]))
+
+    # the meta events made from the name and the rest of the meta information of the track
+    # every event is placed before the events in the event table at the same tick
+    def collectMetaEvents(self):
+        metaEvents = []
+        ticks = self.eventTable.columns["tick"]
+
+        def add(tick, status, type, data):
+            metaEvents.append(
+                (bisect_left(ticks, tick), tick, status, type, bytes(data)))
+
+        if self.sequenceNumber is not None:
+            add(0, 0xFF, 0x00, self.sequenceNumber.to_bytes(2, "big"))
+        if self.copyright is not None:
+            add(0, 0xFF, 0x02, self.copyright)
+        # names are kept as the text of their bytes, e.g. "b'Piano'"
+        for type, name in ((0x03, self.name), (0x04, self.instrument)):
+            if name.startswith(("b'", 'b"')):
+                add(0, 0xFF, type, ast.literal_eval(name))
+            elif name:
+                add(0, 0xFF, type, name.encode("latin-1"))
+        if self.channelPrefix is not None:
+            add(0, 0xFF, 0x20, (self.channelPrefix, ))
+        if self.port is not None:
+            add(0, 0xFF, 0x21, (self.port, ))
+        if self.smpteOffset is not None:
+            add(0, 0xFF, 0x54, self.smpteOffset)
+        for tick, tempo in self.tempoChanges:
+            add(tick, 0xFF, 0x51, tempo.to_bytes(3, "big"))
+        for tick, numerator, denominator, clocks, notes in self.timeSignatures:
+            add(tick, 0xFF, 0x58,
+                (numerator, denominator.bit_length() - 1, clocks, notes))
+        for tick, sharps, minor in self.keySignatures:
+            add(tick, 0xFF, 0x59, (sharps & 0xFF, minor))
+        for type, texts in ((0x01, self.texts), (0x05, self.lyrics),
+                            (0x06, self.markers), (0x07, self.cuePoints),
+                            (0x7F, self.sequencerSpecific)):
+            for tick, text in texts:
+                add(tick, 0xFF, type, text)
+        for tick, status, data in self.systemExclusive:
+            add(tick, status, 0, data)
+        metaEvents.sort(key=lambda event: (event[0], event[1]))
+        return metaEvents
+
+    # writes the events of the track into a bytearray from the offset pos, with every meta and
+    # system exclusive event where it was in the file, and gives the offset after the last byte
+    # the bytearray must have room for maxSize() bytes
+    # metaEvents = the meta events to write, by default writtenMetaEvents()
+    # the status byte is left out whenever it is the same as the last one (running status), meta
+    # and system exclusive events cancel the running status, as in the MIDI file specification
+    # the events in the event table must be in the order of their ticks, a meta event at an
+    # earlier tick than the event before it is written at the tick of that event
+    def writeEvents(self, out, pos, metaEvents=None):
+        columns = self.eventTable.columns
+        if metaEvents is None:
+            metaEvents = self.writtenMetaEvents()
+        endTick = 0
+        if metaEvents and metaEvents[-1][2] == 0xFF and metaEvents[-1][
+                3] == 0x2F:
+            endTick = metaEvents[-1][1]
+            metaEvents = metaEvents[:-1]
+
+        nMeta = len(metaEvents)
+        nextMeta = metaEvents[0][0] if nMeta else -1
+        m = 0
+        previousStatus = 0
+        lastTick = 0
+        for i, (tick, status, key, velocity) in enumerate(
+                zip(columns["tick"], columns["status"], columns["key"],
+                    columns["velocity"])):
+            while nextMeta == i:
+                position, metaTick, metaStatus, type, data = metaEvents[m]
+                if metaTick > lastTick:
+                    pos = writeValue(out, pos, metaTick - lastTick)
+                    lastTick = metaTick
+                else:
+                    out[pos] = 0
+                    pos += 1
+                out[pos] = metaStatus
+                if metaStatus == 0xFF:
+                    out[pos + 1] = type
+                    pos += 1
+                pos = writeValue(out, pos + 1, len(data))
+                out[pos:pos + len(data)] = data
+                pos += len(data)
+                previousStatus = 0
+                m += 1
+                nextMeta = metaEvents[m][0] if m < nMeta else -1
+
+            if tick < lastTick:
+                raise ValueError("The events of the track are not in the "
+                                 "order of their ticks")
+            pos = writeValue(out, pos, tick - lastTick)
+            lastTick = tick
+            if status != previousStatus:
+                out[pos] = status
+                pos += 1
+                previousStatus = status
+            out[pos] = key
+            if 0xC0 <= status < 0xE0:
+                pos += 1
+            else:
+                out[pos + 1] = velocity
+                pos += 2
+
+        # the meta events after the last event
+        for position, metaTick, metaStatus, type, data in metaEvents[m:]:
+            pos = writeValue(out, pos, max(metaTick - lastTick, 0))
+            lastTick = max(metaTick, lastTick)
+            out[pos] = metaStatus
+            if metaStatus == 0xFF:
+                out[pos + 1] = type
+                pos += 1
+            pos = writeValue(out, pos + 1, len(data))
+            out[pos:pos + len(data)] = data
+            pos += len(data)
+
+        # every track ends with an End Of Track event
+        pos = writeValue(out, pos, max(endTick - lastTick, 0))
+        out[pos:pos + 3] = b"\xff\x2f\x00"
+        return pos + 3
+
+    # the most bytes writeEvents can write for the track
+    # every event takes at most 5 bytes for its delta tick and 3 for the message, and every meta
+    # event 5 for its delta tick, 2 for its status and type and 5 for its length
+    def maxSize(self, metaEvents=None):
+        if metaEvents is None:
+            metaEvents = self.writtenMetaEvents()
+        return (8 * len(self.eventTable) + sum(12 + len(event[4])
+                                               for event in metaEvents) + 8)
+
+    # goes through the events of the track in order, as tuples (absolute tick, event)
+    # meta = True also gives the meta and system exclusive events, as MIDIMetaEvent, where they
+    # were in the track
+    def timeline(self, meta=True):
+        metaEvents = self.metaEvents if meta else ()
+        nMeta = len(metaEvents)
+        m = 0
+        lastTick = 0
+        for i, (tick, event) in enumerate(
+                zip(self.eventTable.columns["tick"], self.events)):
+            while m < nMeta and metaEvents[m][0] <= i:
+                position, metaTick, status, type, data = metaEvents[m]
+                yield metaTick, MIDIMetaEvent(status, type, data,
+                                              metaTick - lastTick)
+                lastTick = metaTick
+                m += 1
+            yield tick, event
+            lastTick = tick
+        for position, metaTick, status, type, data in metaEvents[m:]:
+            yield metaTick, MIDIMetaEvent(status, type, data,
+                                          metaTick - lastTick)
+            lastTick = metaTick
+
+    # the events and notes of the track as NumPy structured arrays, with the fields in
+    # EventFields and NoteFields
+    def to_arrays(self):
+        return self.eventTable.toArray(), self.noteTable.toArray()
 
 
 # the MIDI file class
@@ -139,23 +1229,96 @@ class MIDIFile:
         "MetaSequencerSpecific": 0x7F,
     }
 
+    # changes whenever the parser gives different tracks, events or notes for the same file
+    # saved results from an older version (see cache.py) are then parsed again
+    ParserVersion = 6
+
+    # the most events (of any kind) that are decoded from a file, a file with more of them raises
+    # MIDILimitError, so a hostile file cannot fill the memory
+    MaxEvents = 1 << 24
+
+    # the ticks per quarter note of a file that is written without a header (see toBytes)
+    DefaultDivision = 480
+
+    # by default the whole file is read into memory once and parsed from the buffer
+    # fromBuffer = False uses parseFile instead, which reads the file one byte at a time
+    # useMmap = True memory maps the file instead of reading it, which helps for very large files
+    # every file keeps its own tracks, tempo and BPM, so any number of files can be parsed in one process
+    # without a filename, the file is left empty
+    # warn = called with a message for anything in the file that is not recognised, by default
+    # the message is logged as a warning with the "midipy" logger
+    # profile = a MIDIProfile that times the phases of every parse, and counts what they find
+    # lazy = True only reads the header and finds the tracks, every track is decoded the first time
+    # it is used (see parseLazy)
+    # strict = True raises a MIDIError for any problem in the file, otherwise (lenient) a track that
+    # is cut short or malformed keeps the events before the problem, and the problem is passed to
+    # warn. A file that is not a MIDI file, or goes over a limit, raises in both modes
+    # maxEvents = the most events decoded from the file, by default MIDIFile.MaxEvents
+    def __init__(self,
+                 filename=None,
+                 fromBuffer=True,
+                 useMmap=False,
+                 warn=None,
+                 profile=None,
+                 lazy=False,
+                 strict=False,
+                 maxEvents=None):
+        self.warn = warn or logger.warning
+        self.profile = profile
+        self.strict = strict
+        self.maxEvents = MIDIFile.MaxEvents if maxEvents is None else maxEvents
+        self.reset()
+        if filename is None:
+            return
+        if lazy:
+            self.parseLazy(filename)
+        elif fromBuffer:
+            self.parseBuffered(filename, useMmap)
+        else:
+            self.parseFile(filename)
+
+    # clears anything left from a previous parse
     # this includes the tracks and the tempo and BPM of the file
-    tracks = []
-    tempo = 0
-    bpm = 0
-    temp = ""
-
-    def __init__(self, filename):
-        MIDIFile.parseFile(filename)
+    def reset(self):
+        self.__dict__.pop("pendingTracks", None)
+        self.header = None
+        self.tracks = []
+        self.tempoMap = None
+        self.noteIndex = None
+        self.tempo = 0
+        self.bpm = 0
+        self.eventCount = 0
+
+    # handles a problem in the file: raises the error in strict mode (or if it is a limit),
+    # otherwise passes its message to warn and the parse goes on
+    def problem(self, error):
+        if self.strict or isinstance(error, MIDILimitError):
+            raise error
+        self.warn(str(error))
+
+    # opens a file and parses it from a buffer holding the whole file
+    def parseBuffered(self, filename, useMmap=False):
+        with open(filename, "rb") as f:
+            if useMmap and not os.fstat(f.fileno()).st_size:
+                raise MIDIHeaderError("The file is empty")
+            if useMmap:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                    with memoryview(m) as data:
+                        self.parseBuffer(data)
+            else:
+                with memoryview(f.read()) as data:
+                    self.parseBuffer(data)
 
     # A function that parses the file
-    def parseFile(filename):
+    def parseFile(self, filename):
+        self.reset()
+        profile = self.profile
+        if profile is not None:
+            profile.start()
+
         # MIDI files are a sequence of bytes
         with open(filename, "rb") as f:
 
-            # read a string of given size
-            readString = lambda n: str(f.read(n))
-
             # reading an integer (value)
             # MIDI values are between the ranges 0-127
             # this means they only use 7 bits of the byte, but for values > 127
@@ -163,6 +1326,9 @@ class MIDIFile:
             def readValue():
                 # read the first byte
                 num = f.read(1)
+                if not num:
+                    raise MIDIEventError(
+                        "The track is cut short by the end of the file")
                 nByte = 0
 
                 nValue = int.from_bytes(num, "big")
@@ -172,325 +1338,985 @@ class MIDIFile:
                     nValue = nValue & 0x7F
                     # read the next byte
                     num = f.read(1)
+                    if not num:
+                        raise MIDIEventError(
+                            "The track is cut short by the end of the file")
                     nByte = int.from_bytes(num, "big")
                     # add the next 7 bits of the next byte, shifting the first 7 bits to the left
                     nValue = (nValue << 7) | (nByte & 0x7F)
+                    nBytes = 2
                     while nByte & 0x80:
+                        if nBytes == MaxValueBytes:
+                            raise MIDIEventError(
+                                "Variable length value longer than " +
+                                str(MaxValueBytes) + " bytes")
+                        nBytes += 1
                         # read the next byte
                         num = f.read(1)
+                        if not num:
+                            raise MIDIEventError(
+                                "The track is cut short by the end of the file"
+                            )
                         nByte = int.from_bytes(num, "big")
                         # add the next 7 bits of the next byte, shifting the first 7 bits to the left
                         nValue = (nValue << 7) | (nByte & 0x7F)
                 return nValue
 
+            # reading a data byte of a voice message, which must be inside the track being read
+            def readByte():
+                if f.tell() >= trackEnd:
+                    raise MIDIEventError(
+                        "The last event runs past the end of the track")
+                return f.read(1)[0]
+
             # read File information
-            fileID = f.read(4)
-            headerLength = int.from_bytes(f.read(4), "big")
-            nFormat = int.from_bytes(f.read(2), "big")
-            trackChunks = int.from_bytes(f.read(2), "big")
-            division = int.from_bytes(f.read(2), "big")
-
-            # add to the temp
-            MIDIFile.temp = ("\nFile ID: " + str(fileID) + " header length: " +
-                             str(headerLength) + " format: " + str(nFormat) +
-                             " Number of Tracks: " + str(trackChunks) +
-                             " number of divisions: " + str(division))
-
-            # print(fileID)
-            # print(headerLength)
-            # print(nFormat)
-            # print(trackChunks)
-            # print(division)
-
-            # parsing every track
-            for chunk in range(trackChunks):
+            fileSize = os.fstat(f.fileno()).st_size
+            self.header = MIDIHeader.fromBuffer(f.read(14))
+            trackChunks = self.header.trackChunks
+            # the header chunk can be longer than the fields that are read
+            f.seek(8 + self.header.headerLength)
+            if profile is not None:
+                profile.mark("header")
+
+            # parsing every track, chunks that are not tracks are skipped
+            chunk = 0
+            while chunk < trackChunks:
+                # reading the ID and length of the track
+                chunkHeader = f.read(8)
+                if len(chunkHeader) < 8:
+                    self.problem(
+                        MIDIChunkError("The file ends after " + str(chunk) +
+                                       " of " + str(trackChunks) + " tracks"))
+                    break
+                trackID = chunkHeader[0:4]
+                trackLength = int.from_bytes(chunkHeader[4:8], "big")
+                trackEnd = f.tell() + trackLength
+                if trackEnd > fileSize:
+                    self.problem(
+                        MIDIChunkError(
+                            "Chunk " + str(trackID) + " is " +
+                            str(trackLength) +
+                            " bytes long, but the file ends after " +
+                            str(fileSize - f.tell())))
+                    trackEnd = fileSize
+                if trackID != b"MTrk":
+                    f.seek(trackEnd)
+                    continue
+
                 endTrack = False
                 wallTime = 0
                 previousState = 0
-                events = []
+                remaining = self.maxEvents - self.eventCount
+                nEvents = 0
 
                 # creating an track object for the file
-                MIDIFile.tracks.append(MIDITrack())
-
-                # reading the ID and length of the track
-                trackID = f.read(4)
-                trackLength = int.from_bytes(f.read(4), "big")
-
-                MIDIFile.temp = (MIDIFile.temp +
-                                 ("\n-------- NEW TRACK --------") +
-                                 "\nTrack ID: " + str(trackID) +
-                                 "\nTrack Length: " + str(trackLength) + "\n")
-
-                print("\n-------- NEW TRACK --------")
-                # loop till the end of the track
-                while not endTrack:
-                    # the time difference between last note and current note is the delta
-                    statusTimeDelta = readValue()
-
-                    # the data can begin with an ID or instruction, to check which one it is, we check the status
-                    num = f.read(1)
-                    status = int.from_bytes(num, "big")
-
-                    # if it begins with an instruction
-                    if status < 0x80:
-                        # set the previous status as the current status
-                        status = previousState
-                        # since we read the instruction byte, we need to bring it back on the stream so we can sync the values
-                        f.seek(-1, os.SEEK_CUR)
-
-                    # parse to read the instruction and identify it
-                    if (status & 0xF0) == MIDIFile.EventName["VoiceNoteOff"]:
-                        previousState = status
-
-                        channel = status & 0x0F
-                        noteID = f.read(1)
-                        noteVelocity = f.read(1)
-
-                        events.append(
-                            MIDIEvent(
-                                MIDIEvent.Type.noteOFF,
-                                noteID,
-                                noteVelocity,
-                                statusTimeDelta,
-                            ))
-                    elif (status & 0xF0) == MIDIFile.EventName["VoiceNoteOn"]:
-                        previousState = status
-
-                        channel = status & 0x0F
-                        noteID = f.read(1)
+                self.tracks.append(MIDITrack())
+
+                self.tracks[chunk].trackID = trackID
+                self.tracks[chunk].trackLength = trackEnd - f.tell()
+
+                try:
+                    # loop till the end of the track
+                    while not endTrack:
+                        # the track must end with an End Of Track event, before the end of its chunk
+                        position = f.tell()
+                        if position > trackEnd:
+                            raise MIDIEventError(
+                                "The last event runs past the end of the track"
+                            )
+                        elif position == trackEnd:
+                            raise MIDIEventError(
+                                "The track has no End Of Track event")
+                        nEvents += 1
+                        if nEvents > remaining:
+                            raise MIDILimitError("The file has more than " +
+                                                 str(self.maxEvents) +
+                                                 " events")
+
+                        # the time difference between last note and current note is the delta
+                        statusTimeDelta = readValue()
+                        wallTime = wallTime + statusTimeDelta
+                        if f.tell() >= trackEnd:
+                            raise MIDIEventError(
+                                "The last event runs past the end of the track"
+                            )
+
+                        # the data can begin with an ID or instruction, to check which one it is, we check the status
                         num = f.read(1)
-                        noteVelocity = int.from_bytes(num, "big")
-
-                        # if the veloctiy is 0, that means the note isnt being played
-                        if noteVelocity == 0:
-                            events.append(
-                                MIDIEvent(
-                                    MIDIEvent.Type.noteOFF,
-                                    noteID,
-                                    noteVelocity,
-                                    statusTimeDelta,
-                                ))
-                        else:
-                            events.append(
-                                MIDIEvent(
-                                    MIDIEvent.Type.noteON,
-                                    noteID,
-                                    noteVelocity,
-                                    statusTimeDelta,
-                                ))
-
-                    elif (status
-                          & 0xF0) == MIDIFile.EventName["VoiceAftertouch"]:
-                        previousState = status
-
-                        key = status & 0x0F
-                        keyPressure = f.read(1)
-                        events.append(MIDIEvent(MIDIEvent.Type.other))
-
-                    elif (status
-                          & 0xF0) == MIDIFile.EventName["VoiceControlChange"]:
-                        previousState = status
-
-                        channel = status & 0x0F
-                        controlID = f.read(1)
-                        controlValue = f.read(1)
-                        events.append(MIDIEvent(MIDIEvent.Type.other))
-
-                    elif (status
-                          & 0xF0) == MIDIFile.EventName["VoiceProgramChange"]:
-                        previousState = status
-                        channel = status & 0x0F
-                        programID = f.read(1)
-                        events.append(MIDIEvent(MIDIEvent.Type.other))
-
-                    elif (status &
-                          0xF0) == MIDIFile.EventName["VoiceChannelPressure"]:
-                        previousState = status
-
-                        channel = status & 0x0F
-                        channelPressure = f.read(1)
-                        events.append(MIDIEvent(MIDIEvent.Type.other))
-
-                    elif (status
-                          & 0xF0) == MIDIFile.EventName["VoicePitchBend"]:
-                        previousState = status
-
-                        channel = status & 0x0F
-                        LS7B = f.read(1)
-                        MS7B = f.read(1)
-                        events.append(MIDIEvent(MIDIEvent.Type.other))
-
-                    elif (status
-                          & 0xF0) == MIDIFile.EventName["SystemExclusive"]:
-                        previousState = 0
-
-                        if status == 0xFF:
-                            # read meta message
-                            n = f.read(1)
-                            type = int.from_bytes(n, "big")
-                            length = readValue()
-
-                            if type == MIDIFile.MetaEventName["MetaSequence"]:
-                                print("Sequence number: " + f.read(1) + " " +
-                                      f.read(1))
-                            elif type == MIDIFile.MetaEventName["MetaText"]:
-                                print("Text: " + readString(length))
-                            elif type == MIDIFile.MetaEventName[
-                                    "MetaCopyright"]:
-                                print("Copyright: " + readString(length))
-                            elif type == MIDIFile.MetaEventName[
-                                    "MetaTrackName"]:
-                                MIDIFile.tracks[chunk].setName(
-                                    readString(length))
-                                print("Name: " +
-                                      str(MIDIFile.tracks[chunk].name))
-                            elif type == MIDIFile.MetaEventName[
-                                    "MetaInstrumentName"]:
-                                MIDIFile.tracks[chunk].setInstrument(
-                                    readString(length))
-                                print("Instrument: " +
-                                      MIDIFile.tracks[chunk].instrument)
-                            elif type == MIDIFile.MetaEventName["MetaLyrics"]:
-                                print("Lyrics: " + readString(length))
-                            elif type == MIDIFile.MetaEventName["MetaMarker"]:
-                                print("Marker: " + readString(length))
-                            elif type == MIDIFile.MetaEventName[
-                                    "MetaCuePoint"]:
-                                print("Cue: " + readString(length))
-                            elif type == MIDIFile.MetaEventName[
-                                    "MetaChannelPrefix"]:
-                                print("Prefix: " + str(f.read(1)))
-                            elif type == MIDIFile.MetaEventName[
-                                    "MetaEndOfTrack"]:
-                                endTrack = True
-                            elif type == MIDIFile.MetaEventName[
-                                    "MetaSetTempo"]:
-                                n1 = 0
-                                n = int.from_bytes(f.read(1), "big")
-                                n1 |= n << 16
-                                n = int.from_bytes(f.read(1), "big")
-                                n1 |= n << 8
-                                n = int.from_bytes(f.read(1), "big")
-                                n1 |= n << 0
-                                MIDIFile.bpm = 60000000 / n1
-                                if n1 != MIDIFile.tempo:
-                                    MIDIFile.tempo = n1
-                                    print("Tempo: " + str(MIDIFile.tempo) +
-                                          " (" + str(MIDIFile.bpm) + "bpm)")
-                            elif type == MIDIFile.MetaEventName[
-                                    "MetaSMPTEOffset"]:
-                                print("SMPTE: H:" + str(f.read(1)) + " M:" +
-                                      str(f.read(1)) + " S:" + str(f.read(1)) +
-                                      " FR:" + str(f.read(1)) + " FF:" +
-                                      str(f.read(1)))
-                            elif type == MIDIFile.MetaEventName[
-                                    "MetaTimeSignature"]:
-                                n1 = f.read(1)
-                                num = f.read(1)
-                                n2 = int.from_bytes(num, "big")
-                                print("Time Signature: " +
-                                      str(int.from_bytes(n1, "big")) + "/" +
-                                      str(2 << n2))
-                                n1 = f.read(1)
-                                num = f.read(1)
-                                print("Clocks Per Metronome Tick: " +
-                                      str(int.from_bytes(n1, "big")))
-                                print(
-                                    "Number of 1/32 notes per 24 MIDI clocks: "
-                                    + str(int.from_bytes(num, "big")))
-                            elif type == MIDIFile.MetaEventName[
-                                    "MetaKeySignature"]:
-                                print("Key Signature: " +
-                                      str(int.from_bytes(f.read(1), "big")))
-                                print("Minor Key: " +
-                                      str(int.from_bytes(f.read(1), "big")))
-                            elif type == MIDIFile.MetaEventName["MetaPort"]:
-                                print("Meta Port")
-                                f.read(1)
-                            elif (type == MIDIFile.
-                                  MetaEventName["MetaSequencerSpecific"]):
-                                print("Sequencer Specific: " +
-                                      readString(length))
+                        if not num:
+                            raise MIDIEventError(
+                                "The track is cut short by the end of the file"
+                            )
+                        status = int.from_bytes(num, "big")
+
+                        # if it begins with an instruction
+                        if status < 0x80:
+                            # set the previous status as the current status
+                            status = previousState
+                            # since we read the instruction byte, we need to bring it back on the stream so we can sync the values
+                            f.seek(-1, os.SEEK_CUR)
+
+                        # parse to read the instruction and identify it
+                        if (status
+                                & 0xF0) == MIDIFile.EventName["VoiceNoteOff"]:
+                            previousState = status
+
+                            noteID = readByte()
+                            noteVelocity = readByte()
+                            self.tracks[chunk].addMessage(
+                                status, noteID, noteVelocity, statusTimeDelta,
+                                wallTime)
+                        elif (status
+                              & 0xF0) == MIDIFile.EventName["VoiceNoteOn"]:
+                            previousState = status
+
+                            # a velocity of 0 is stored as a note off by addMessage
+                            noteID = readByte()
+                            noteVelocity = readByte()
+                            self.tracks[chunk].addMessage(
+                                status, noteID, noteVelocity, statusTimeDelta,
+                                wallTime)
+
+                        elif (status
+                              & 0xF0) == MIDIFile.EventName["VoiceAftertouch"]:
+                            previousState = status
+
+                            key = readByte()
+                            keyPressure = readByte()
+                            self.tracks[chunk].addMessage(
+                                status, key, keyPressure, statusTimeDelta,
+                                wallTime)
+
+                        elif (status
+                              & 0xF0
+                              ) == MIDIFile.EventName["VoiceControlChange"]:
+                            previousState = status
+
+                            controlID = readByte()
+                            controlValue = readByte()
+                            self.tracks[chunk].addMessage(
+                                status, controlID, controlValue,
+                                statusTimeDelta, wallTime)
+
+                        elif (status
+                              & 0xF0
+                              ) == MIDIFile.EventName["VoiceProgramChange"]:
+                            previousState = status
+                            programID = readByte()
+                            self.tracks[chunk].addMessage(
+                                status, programID, 0, statusTimeDelta,
+                                wallTime)
+
+                        elif (status & 0xF0
+                              ) == MIDIFile.EventName["VoiceChannelPressure"]:
+                            previousState = status
+
+                            channelPressure = readByte()
+                            self.tracks[chunk].addMessage(
+                                status, channelPressure, 0, statusTimeDelta,
+                                wallTime)
+
+                        elif (status
+                              & 0xF0) == MIDIFile.EventName["VoicePitchBend"]:
+                            previousState = status
+
+                            LS7B = readByte()
+                            MS7B = readByte()
+                            self.tracks[chunk].addMessage(
+                                status, LS7B, MS7B, statusTimeDelta, wallTime)
+
+                        elif (status
+                              & 0xF0) == MIDIFile.EventName["SystemExclusive"]:
+                            previousState = 0
+
+                            if status == 0xFF:
+                                # read meta message
+                                if f.tell() >= trackEnd:
+                                    raise MIDIEventError(
+                                        "The last event runs past the end of "
+                                        "the track")
+                                n = f.read(1)
+                                type = int.from_bytes(n, "big")
+                                length = readValue()
+                                if f.tell() + length > trackEnd:
+                                    raise MIDIEventError(
+                                        "Meta event runs past the end of the "
+                                        "track")
+                                self.parseMeta(self.tracks[chunk], type,
+                                               f.read(length), wallTime)
+
+                                if type == MIDIFile.MetaEventName[
+                                        "MetaEndOfTrack"]:
+                                    endTrack = True
+
+                            elif status == 0xF0 or status == 0xF7:
+                                length = readValue()
+                                if f.tell() + length > trackEnd:
+                                    raise MIDIEventError(
+                                        "System exclusive event runs past the "
+                                        "end of the track")
+                                self.tracks[chunk].addSystemExclusive(
+                                    wallTime, status, f.read(length))
                             else:
-                                print("Unrecognised meta event: " + str(type))
-
-                        if status == 0xF0:
-                            print("System Executive Begins" +
-                                  readString(readValue()))
-
-                        if status == 0xF7:
-                            print("System Executive Ends" +
-                                  readString(readValue()))
+                                self.problem(
+                                    MIDIEventError(
+                                        "Unrecognised Status Byte: " +
+                                        str(status) + " in track " +
+                                        str(chunk)))
+                        else:
+                            self.problem(
+                                MIDIEventError("Unrecognised Status Byte: " +
+                                               str(status) + " in track " +
+                                               str(chunk)))
+
+                except MIDIError as error:
+                    # unrecognised status bytes already name their track
+                    if isinstance(error, MIDIEventError) and not str(
+                            error).startswith("Unrecognised"):
+                        error = MIDIEventError(
+                            str(error) + " (track " + str(chunk) + ")")
+                    self.problem(error)
+                self.eventCount += nEvents
+
+                # anything left in the chunk after its End Of Track event is skipped
+                f.seek(trackEnd)
+                chunk += 1
+            size = f.tell()
+
+        if profile is not None:
+            profile.mark("decode")
+        self.buildNotes()
+        if profile is not None:
+            profile.mark("notes")
+        self.buildTempoMap()
+        if profile is not None:
+            profile.mark("tempo")
+            profile.countFile(self, size)
+
+    # A function that parses a buffer holding the whole file (bytes, a memoryview or an mmap)
+    # it gives the same tracks, events and notes as parseFile, but walks the buffer by offset
+    # instead of calling f.read for every byte
+    def parseBuffer(self, data):
+        self.reset()
+        profile = self.profile
+        if profile is not None:
+            profile.start()
+
+        # read File information
+        self.header = MIDIHeader.fromBuffer(data)
+        if profile is not None:
+            profile.mark("header")
+
+        # parsing every track
+        for chunk, trackID, start, end in findTracks(data, self.header,
+                                                     self.problem):
+            track = MIDITrack()
+            self.tracks.append(track)
+
+            track.trackID = trackID
+            track.trackLength = end - start
+            self.parseTrack(track, data, start, end, chunk)
+
+        if profile is not None:
+            profile.mark("decode")
+        self.buildNotes()
+        if profile is not None:
+            profile.mark("notes")
+        self.buildTempoMap()
+        if profile is not None:
+            profile.mark("tempo")
+            profile.countFile(self, len(data))
+
+    # decodes the events of one track, from the offset start up to end in the buffer
+    # chunk = the index of the track in the file
+    def parseTrack(self, track, data, start, end, chunk):
+        typeValues = MIDIEvent.MessageTypeValues
+        noteOFF = MIDIEvent.Type.noteOFF.value
+        remaining = self.maxEvents - self.eventCount
+
+        # the columns of the event table, filled in as the events are decoded
+        columns = track.eventTable.columns
+        addDelta = columns["deltaTick"].append
+        addTick = columns["tick"].append
+        addType = columns["type"].append
+        addChannel = columns["channel"].append
+        addKey = columns["key"].append
+        addVelocity = columns["velocity"].append
+        addStatus = columns["status"].append
+        wallTime = 0
+        n = 0
+
+        try:
+            for n, (statusTimeDelta, status, data1, data2,
+                    payload) in enumerate(decodeTrack(data, start, end), 1):
+                wallTime += statusTimeDelta
+                if n > remaining:
+                    raise MIDILimitError("The file has more than " +
+                                         str(self.maxEvents) + " events")
+
+                if 0x80 <= status < 0xF0:
+                    addDelta(statusTimeDelta)
+                    addTick(wallTime)
+                    if status >> 4 == 0x9 and not data2:
+                        # if the veloctiy is 0, that means the note isnt being played
+                        addType(noteOFF)
                     else:
-                        print("Unrecognised Status Byte: " + str(status))
-
-                # add the list of events to the track
-                MIDIFile.tracks[chunk].setEvents(events)
-
-            # creating list of notes used in every track
-            for track in MIDIFile.tracks:
-                wallTime = 0
-                processedNotes = []  # notes that are being processed
-                notes = []  # notes that have been processed
-
-                for eve in track.events:
-                    # getting the total time since
-                    wallTime = wallTime + eve.deltaTick
-
-                    if eve.type == MIDIEvent.Type.noteON:
-                        processedNotes.append(
-                            MIDINote(eve.key, eve.velocity, wallTime, 0))
-                    # if a note has ended
-                    elif eve.type == MIDIEvent.Type.noteOFF:
-
-                        def findNote(noteList):
-                            for n in noteList:
-                                if n.key == eve.key:
-                                    return n
-
-                        # finding the note when it began
-                        note = findNote(processedNotes)
-
-                        if note:
-                            processedNotes.remove(note)
-                            # getting duration
-                            note.duration = wallTime - note.startTime
-                            notes.append(note)
-
-                            # checking minimum and maximum of a note in a track
-                            track.minNote = min(
-                                track.minNote, int.from_bytes(note.key, "big"))
-                            track.maxNote = min(
-                                track.maxNote, int.from_bytes(note.key, "big"))
-                # Setting the track's notes
-                track.notes = notes
+                        addType(typeValues[status >> 4])
+                    addChannel(status & 0x0F)
+                    addKey(data1)
+                    addVelocity(data2)
+                    addStatus(status)
+                elif status == 0xFF:
+                    self.parseMeta(track, data1, payload, wallTime)
+                elif status == 0xF0 or status == 0xF7:
+                    track.addSystemExclusive(wallTime, status, bytes(payload))
+                else:
+                    self.problem(
+                        MIDIEventError("Unrecognised Status Byte: " +
+                                       str(status) + " in track " +
+                                       str(chunk)))
+        except MIDIError as error:
+            # unrecognised status bytes already name their track
+            if isinstance(error, MIDIEventError
+                          ) and not str(error).startswith("Unrecognised"):
+                error = MIDIEventError(
+                    str(error) + " (track " + str(chunk) + ")")
+            self.problem(error)
+        self.eventCount += n
+
+    # opens a file for lazy parsing, only the header and the offset of every track are read
+    # every track is decoded (and its notes paired) the first time anything in it is used, so
+    # reading one track, or the names of a few, does not decode the rest of the file
+    # the tempo, the BPM and the tempo map need every track, so using any of them decodes the
+    # tracks that are left
+    # the file is memory mapped, so opening it only reads the chunk headers, and it stays mapped
+    # until every track has been decoded
+    def parseLazy(self, filename):
+        self.reset()
+        profile = self.profile
+        if profile is not None:
+            profile.start()
 
-    def __repr__(self):
+        with open(filename, "rb") as f:
+            if not os.fstat(f.fileno()).st_size:
+                raise MIDIHeaderError("The file is empty")
+            data = memoryview(mmap.mmap(f.fileno(), 0,
+                                        access=mmap.ACCESS_READ))
+        self.header = MIDIHeader.fromBuffer(data)
+        self.pendingTracks = 0
+        for chunk, trackID, start, end in findTracks(data, self.header,
+                                                     self.problem):
+            self.tracks.append(
+                MIDITrack.lazy(trackID, end - start,
+                               self.trackDecoder(data, start, end, chunk)))
+            self.pendingTracks += 1
+
+        # the tempo is only known once every track is decoded, see __getattr__
+        for name in MIDIFile.LazyFields:
+            delattr(self, name)
+        if profile is not None:
+            profile.mark("header")
+            profile.count("files")
+            profile.count("bytes", len(data))
+            profile.count("tracks", len(self.tracks))
+
+    # the function that decodes one track of a lazy file into a MIDITrack
+    def trackDecoder(self, data, start, end, chunk):
+
+        def decode(track):
+            profile = self.profile
+            if profile is not None:
+                profile.start()
+            self.parseTrack(track, data, start, end, chunk)
+            if profile is not None:
+                profile.mark("decode")
+            MIDIFile.buildTrackNotes(track)
+            if profile is not None:
+                profile.mark("notes")
+                profile.count("events", len(track.eventTable))
+                profile.count("notes", len(track.noteTable))
+            self.pendingTracks -= 1
+
+        return decode
+
+    # decodes every track of a lazy file that has not been used yet
+    def decodeAll(self):
         for track in self.tracks:
-            if track.name != "":
-                MIDIFile.temp = MIDIFile.temp + repr(track)
-        return MIDIFile.temp
-
-
-demo = MIDIFile("bach_846.mid")
-print(demo.tracks[1].notes)
-script = repr(demo)
-f = open("openedMIDI.txt", "w")
-f.write(script)
-f.close()
-
-import matplotlib.pyplot as plt
-
-plt.style.use('seaborn')
-
-for track in demo.tracks:
-    pitch = [ord(note.key) for note in track.notes]
-    tick = [note.startTime for note in track.notes]
-    if pitch:
-        plt.fill_between(tick, pitch, alpha=0.4)
-        plt.plot(tick, pitch, label=track.name, alpha=0.6)
+            track.decode()
+
+    # the fields of a lazy file that are only set once every track is decoded
+    LazyFields = ("tempoMap", "tempo", "bpm")
+
+    def __getattr__(self, name):
+        if name in MIDIFile.LazyFields and "pendingTracks" in self.__dict__:
+            self.decodeAll()
+            # a file without a Set Tempo event keeps the tempo and BPM of reset
+            self.tempo = 0
+            self.bpm = 0
+            self.buildTempoMap()
+            return getattr(self, name)
+        raise AttributeError(name)
+
+    # handles a meta event, given its type, its bytes and the tick it is at
+    # the information in the event is kept on the track (see MIDITrack)
+    def parseMeta(self, track, type, payload, tick):
+        track.metaEvents.append(
+            (len(track.eventTable), tick, 0xFF, type, bytes(payload)))
+        try:
+            self.parseMetaFields(track, type, payload, tick)
+        except IndexError:
+            self.problem(
+                MIDIEventError("Meta event " + str(type) + " at tick " +
+                               str(tick) + " is too short"))
+
+    # keeps the information in a meta event on the track, see parseMeta
+    # raises IndexError if the event does not have the bytes it should
+    def parseMetaFields(self, track, type, payload, tick):
+        if type == MIDIFile.MetaEventName["MetaSequence"]:
+            track.sequenceNumber = int.from_bytes(payload, "big")
+        elif type == MIDIFile.MetaEventName["MetaText"]:
+            track.texts.append((tick, bytes(payload)))
+        elif type == MIDIFile.MetaEventName["MetaCopyright"]:
+            track.copyright = bytes(payload)
+        elif type == MIDIFile.MetaEventName["MetaTrackName"]:
+            track.setName(str(bytes(payload)))
+        elif type == MIDIFile.MetaEventName["MetaInstrumentName"]:
+            track.setInstrument(str(bytes(payload)))
+        elif type == MIDIFile.MetaEventName["MetaLyrics"]:
+            track.lyrics.append((tick, bytes(payload)))
+        elif type == MIDIFile.MetaEventName["MetaMarker"]:
+            track.markers.append((tick, bytes(payload)))
+        elif type == MIDIFile.MetaEventName["MetaCuePoint"]:
+            track.cuePoints.append((tick, bytes(payload)))
+        elif type == MIDIFile.MetaEventName["MetaChannelPrefix"]:
+            track.channelPrefix = payload[0]
+        elif type == MIDIFile.MetaEventName["MetaEndOfTrack"]:
+            pass
+        elif type == MIDIFile.MetaEventName["MetaSetTempo"]:
+            n1 = (payload[0] << 16) | (payload[1] << 8) | payload[2]
+            if n1:
+                track.tempoChanges.append((tick, n1))
+            else:
+                self.problem(
+                    MIDIEventError("Set Tempo event at tick " + str(tick) +
+                                   " has a tempo of 0"))
+        elif type == MIDIFile.MetaEventName["MetaSMPTEOffset"]:
+            track.smpteOffset = tuple(payload[0:5])
+        elif type == MIDIFile.MetaEventName["MetaTimeSignature"]:
+            # the denominator is given as a power of 2
+            track.timeSignatures.append(
+                (tick, payload[0], 1 << payload[1], payload[2], payload[3]))
+        elif type == MIDIFile.MetaEventName["MetaKeySignature"]:
+            # the number of sharps is negative for flats
+            sharps = payload[0] - 256 if payload[0] > 127 else payload[0]
+            track.keySignatures.append((tick, sharps, payload[1]))
+        elif type == MIDIFile.MetaEventName["MetaPort"]:
+            track.port = payload[0]
+        elif type == MIDIFile.MetaEventName["MetaSequencerSpecific"]:
+            track.sequencerSpecific.append((tick, bytes(payload)))
+        else:
+            self.warn("Unrecognised meta event: " + str(type))
+
+    # creating list of notes used in every track
+    def buildNotes(self):
+        for track in self.tracks:
+            MIDIFile.buildTrackNotes(track)
+
+    # this walks the event table of a track, and fills the note table as the notes are found
+    # notes that are being played are kept in a queue for their channel and key, so a note off
+    # is paired with the earliest note on of the same key and channel without searching
+    @staticmethod
+    def buildTrackNotes(track):
+        noteON = MIDIEvent.Type.noteON.value
+        noteOFF = MIDIEvent.Type.noteOFF.value
+        # (start, velocity) of the notes that are being processed
+        processedNotes = {}
+
+        events = track.eventTable.columns
+        columns = track.noteTable.columns
+        addKey = columns["key"].append
+        addVelocity = columns["velocity"].append
+        addStart = columns["start"].append
+        addDuration = columns["duration"].append
+        addChannel = columns["channel"].append
+        minNote = track.minNote
+        maxNote = track.maxNote
+
+        for type, channel, key, velocity, wallTime in zip(
+                events["type"], events["channel"], events["key"],
+                events["velocity"], events["tick"]):
+            if type == noteON:
+                queue = processedNotes.get((channel << 7) | key)
+                if queue is None:
+                    processedNotes[(channel << 7) | key] = deque(
+                        ((wallTime, velocity), ))
+                else:
+                    queue.append((wallTime, velocity))
+            # if a note has ended
+            elif type == noteOFF:
+                # finding the note when it began
+                queue = processedNotes.get((channel << 7) | key)
+
+                if queue:
+                    startTime, noteVelocity = queue.popleft()
+                    addKey(key)
+                    addVelocity(noteVelocity)
+                    addStart(startTime)
+                    # getting duration
+                    addDuration(wallTime - startTime)
+                    addChannel(channel)
+
+                    # checking minimum and maximum of a note in a track
+                    if key < minNote:
+                        minNote = key
+                    elif key > maxNote:
+                        maxNote = key
+        track.minNote = minNote
+        track.maxNote = maxNote
+
+    # builds the tempo map from the tempo changes in every track
+    # the tempo and BPM of the file are from the last Set Tempo event, in the order of the tracks
+    def buildTempoMap(self):
+        for track in self.tracks:
+            if track.tempoChanges:
+                self.tempo = track.tempoChanges[-1][1]
+                self.bpm = 60000000 / self.tempo
+        self.tempoMap = MIDITempoMap(
+            self.header.division,
+            [change for track in self.tracks for change in track.tempoChanges])
+
+    # goes through the events of every track in one stream, in the order they happen
+    # every event is yielded as a tuple (absolute tick, track index, event), events at the same tick
+    # are in the order of the tracks, and then in their order in the track
+    # the tracks are merged with a heap as they are read, so only the next event of every track is
+    # held at a time, and every event costs O(log k) for k tracks
+    # seconds = True gives the time in seconds instead of the tick, from the tempo map
+    # meta = True also gives the meta and system exclusive events (see MIDITrack.timeline)
+    def timeline(self, seconds=False, meta=True):
+        merged = heapq.merge(*[
+            MIDIFile.trackTimeline(track, index, meta)
+            for index, track in enumerate(self.tracks)
+        ],
+                             key=lambda item: item[0])
+        if not seconds:
+            yield from merged
+            return
+
+        # the events come in order, so the tempo segment only ever moves forward
+        tempoMap = self.tempoMap
+        segmentTicks = tempoMap.ticks
+        segment = 0
+        nextSegment = segmentTicks[1] if len(tempoMap) > 1 else None
+        for tick, index, event in merged:
+            while nextSegment is not None and tick >= nextSegment:
+                segment += 1
+                nextSegment = (segmentTicks[segment + 1] if segment +
+                               1 < len(tempoMap) else None)
+            yield (tempoMap.seconds[segment] + (tick - segmentTicks[segment]) *
+                   tempoMap.secondsPerTick[segment], index, event)
+
+    # the timeline of one track, with the index of the track in every tuple
+    @staticmethod
+    def trackTimeline(track, index, meta):
+        for tick, event in track.timeline(meta):
+            yield tick, index, event
+
+    # the index of the notes in every track, it is built the first time it is used, and again
+    # whenever it is out of date (see MIDINoteIndex.isCurrent)
+    # rebuild = True builds it again anyway, which is needed after changing notes in place in the
+    # note tables (e.g. their starts or keys)
+    def indexNotes(self, rebuild=False):
+        if (rebuild or self.noteIndex is None
+                or not self.noteIndex.isCurrent(self.tracks)):
+            self.noteIndex = MIDINoteIndex(self.tracks)
+        return self.noteIndex
+
+    # the (track index, note) of every note playing from startTick up to (not including)
+    # endTick, in any track, in the order they start
+    # minKey, maxKey = only the notes with a key in this range (both included)
+    def notesBetween(self, startTick, endTick, minKey=0, maxKey=127):
+        index = self.indexNotes()
+        return self.notesFromIDs(
+            index, index.between(startTick, endTick, minKey, maxKey))
+
+    # the (track index, note) of every note playing at a tick
+    def notesAt(self, tick, minKey=0, maxKey=127):
+        index = self.indexNotes()
+        return self.notesFromIDs(index, index.at(tick, minKey, maxKey))
+
+    # the notes playing in every (startTick, endTick) range, as a list for every range
+    def notesBetweenMany(self, ranges, minKey=0, maxKey=127):
+        index = self.indexNotes()
+        return [
+            self.notesFromIDs(index, ids)
+            for ids in index.betweenMany(ranges, minKey, maxKey)
+        ]
+
+    # the (track index, note) of the notes with the given ids in a MIDINoteIndex
+    def notesFromIDs(self, index, ids):
+        return [(index.tracks[i],
+                 self.tracks[index.tracks[i]].notes[index.rows[i]])
+                for i in ids]
+
+    # the time signatures of every track, in the order they happen
+    # see MIDITrack.timeSignatures
+    def timeSignatures(self):
+        return sorted((signature for track in self.tracks
+                       for signature in track.timeSignatures),
+                      key=lambda signature: signature[0])
+
+    # the key signatures of every track, in the order they happen
+    # see MIDITrack.keySignatures
+    def keySignatures(self):
+        return sorted((signature for track in self.tracks
+                       for signature in track.keySignatures),
+                      key=lambda signature: signature[0])
+
+    # the events and notes of every track as NumPy structured arrays
+    # returns a list with an (events, notes) pair for every track, see MIDITrack.to_arrays
+    def to_arrays(self):
+        return [track.to_arrays() for track in self.tracks]
+
+    # the file as the bytes of a MIDI file, the header followed by every track
+    # the tracks are written into one bytearray, big enough for all of them, so nothing is copied
+    # a file that was parsed gives the same bytes as the original, unless it used the status
+    # byte where running status could be used, or values with more bytes than they needed
+    # the events come from the event tables and the meta events from writtenMetaEvents, the note
+    # tables are not written, so changes to notes (and not to events) are not in the file
+    # a file without a header (made with MIDIFile()) is written as format 0 for a single track,
+    # otherwise format 1, with DefaultDivision ticks per quarter note
+    def toBytes(self):
+        header = self.header
+        if header is None:
+            header = MIDIHeader(b"MThd", 6, 0 if len(self.tracks) == 1 else 1,
+                                len(self.tracks), MIDIFile.DefaultDivision)
+        metaEvents = [track.writtenMetaEvents() for track in self.tracks]
+        out = bytearray(14 +
+                        sum(8 + track.maxSize(meta)
+                            for track, meta in zip(self.tracks, metaEvents)))
+        out[0:14] = struct.pack(">4sIHHH", b"MThd", 6, header.format,
+                                len(self.tracks), header.division)
+        pos = 14
+        for track, meta in zip(self.tracks, metaEvents):
+            start = pos + 8
+            end = track.writeEvents(out, start, meta)
+            out[pos:start] = struct.pack(">4sI", track.trackID, end - start)
+            pos = end
+        del out[pos:]
+        return out
+
+    # writes the file as a MIDI file
+    # f = a file name, or a file object opened in binary mode
+    def save(self, f):
+        data = self.toBytes()
+        if isinstance(f, (str, os.PathLike)):
+            with open(f, "wb") as out:
+                out.write(data)
+        else:
+            f.write(data)
+
+    # writes the file to a file-like object opened for text, in a single pass
+    # format = "text" for the same text as repr, "jsonl" for one JSON object per line
+    # (the header, then every track followed by its events and notes)
+    def dump(self, f, format="text"):
+        out = MIDIDumpWriter(f)
+        if format == "text":
+            out.write(repr(self.header))
+            for track in self.tracks:
+                out.write("\n-------- NEW TRACK --------" + "\nTrack ID: " +
+                          str(track.trackID) + "\nTrack Length: " +
+                          str(track.trackLength) + "\n")
+            for track in self.tracks:
+                if track.name != "":
+                    track.dumpText(out)
+        elif format == "jsonl":
+            out.write(
+                json.dumps({
+                    "kind": "header",
+                    "fileID": self.header.fileID.decode("latin-1"),
+                    "headerLength": self.header.headerLength,
+                    "format": self.header.format,
+                    "trackChunks": self.header.trackChunks,
+                    "division": self.header.division,
+                }) + "\n")
+            for index, track in enumerate(self.tracks):
+                track.dumpJSON(out, index)
+        else:
+            raise ValueError("Unknown dump format: " + str(format))
+        out.flush()
 
-plt.xlabel("Time step")
-plt.ylabel("Pitch")
-plt.legend(loc='upper right')
-plt.savefig('music.png')
+    def __repr__(self):
+        f = io.StringIO()
+        self.dump(f)
+        return f.getvalue()
+
+
+# reads the header of a MIDI file, without reading any of its tracks
+def read_header(filename):
+    with open(filename, "rb") as f:
+        return MIDIHeader.fromBuffer(f.read(14))
+
+
+# goes through the events of a MIDI file as they are decoded, without building the tracks
+# every event is yielded as a tuple (track index, absolute tick, event), where the event is a
+# MIDIEvent for voice messages, or a MIDIMetaEvent for meta and system exclusive events
+# the file is memory mapped, so only the parts that are read are loaded, and the loop can be
+# stopped at any point, e.g. after the track names and the first tempo
+def iter_events(filename):
+    with open(filename, "rb") as f:
+        if not os.fstat(f.fileno()).st_size:
+            raise MIDIHeaderError("The file is empty")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            header = MIDIHeader.fromBuffer(data)
+            for chunk, trackID, start, end in findTracks(data, header):
+                wallTime = 0
+                for (statusTimeDelta, status, data1, data2,
+                     payload) in decodeTrack(data, start, end):
+                    wallTime += statusTimeDelta
+                    if 0x80 <= status < 0xF0:
+                        yield chunk, wallTime, MIDIEvent.fromMessage(
+                            status, data1, data2, statusTimeDelta)
+                    elif status == 0xFF or status == 0xF0 or status == 0xF7:
+                        yield chunk, wallTime, MIDIMetaEvent(
+                            status, data1, payload, statusTimeDelta)
+
+
+# goes through the notes of a MIDI file as they end, without building the tracks
+# every note is yielded as a tuple (track index, note), in the same order as MIDITrack.notes
+# notes are paired the same way as MIDIFile.buildNotes, so only the notes being played are kept
+def iter_notes(filename):
+    currentChunk = None
+    processedNotes = {}  # notes that are being processed
+
+    for chunk, wallTime, eve in iter_events(filename):
+        if chunk != currentChunk:
+            currentChunk = chunk
+            processedNotes = {}
+
+        if eve.type is MIDIEvent.Type.noteON:
+            note = MIDINote(eve.key, eve.velocity, wallTime, 0, eve.channel)
+            queue = processedNotes.get((eve.channel << 7) | eve.key)
+            if queue is None:
+                processedNotes[(eve.channel << 7) | eve.key] = deque((note, ))
+            else:
+                queue.append(note)
+        elif eve.type is MIDIEvent.Type.noteOFF:
+            queue = processedNotes.get((eve.channel << 7) | eve.key)
+            if queue:
+                note = queue.popleft()
+                note.duration = wallTime - note.startTime
+                yield chunk, note
+
+
+# decodes a MIDI file from bytes that arrive a piece at a time, e.g. from a socket or a pipe
+# feed gives the events that the new bytes complete, as tuples (track index, absolute tick, event)
+# like iter_events, and keeps the bytes of an event that is not complete yet (a delta tick, a
+# message or a meta event split between two pieces) until the rest of it arrives
+# nothing is ever read twice from the source or searched for, so it works on streams that cannot
+# seek, and it only holds the bytes of the event it is waiting for
+# header = the MIDIHeader of the file, once its bytes have arrived
+# maxEventLength = the longest meta or system exclusive event that is accepted, so a damaged
+# length cannot make the decoder wait for (and keep) gigabytes of bytes
+# maxEvents = the most events decoded from the stream, by default MIDIFile.MaxEvents
+# like the strict parsers, an event that runs past the end of its track, or a track without an End
+# Of Track event, raises MIDIEventError, and the chunks after the last track are ignored
+class MIDIStreamDecoder:
+
+    def __init__(self, maxEventLength=1 << 24, maxEvents=None):
+        self.maxEventLength = maxEventLength
+        self.maxEvents = MIDIFile.MaxEvents if maxEvents is None else maxEvents
+        self.eventCount = 0
+        self.header = None
+        self.pending = bytearray()  # the bytes that have not been decoded yet
+        self.offset = 0  # the offset in the stream of the first pending byte
+        self.chunk = -1  # the index of the track being decoded
+        self.trackEnd = None  # the offset in the stream where the track ends
+        self.skipTo = 0  # the offset in the stream of the next chunk, for skipped chunks
+        self.wallTime = 0
+        self.previousState = 0
+
+    # adds the next bytes of the stream, and gives the events they complete
+    def feed(self, data):
+        pending = self.pending
+        pending += data
+        events = []
+        pos = 0
+        while True:
+            start = self.offset + pos
+            if self.header is None:
+                # the header chunk, with its ID and length before it
+                if len(pending) - pos < 8:
+                    break
+                if pending[pos:pos + 4] != b"MThd":
+                    raise MIDIHeaderError(
+                        "The file does not start with a MThd chunk")
+                headerLength = int.from_bytes(pending[pos + 4:pos + 8], "big")
+                if headerLength > self.maxEventLength:
+                    raise MIDILimitError(
+                        "Header of " + str(headerLength) +
+                        " bytes is longer than maxEventLength")
+                if len(pending) - pos < 8 + headerLength:
+                    break
+                self.header = MIDIHeader.fromBuffer(pending[pos:pos + 14])
+                pos += 8 + headerLength
+            elif start < self.skipTo:
+                # the rest of a chunk that is not a track, or after the end of a track
+                pos = min(len(pending), pos + self.skipTo - start)
+                if pos == len(pending):
+                    break
+            elif self.trackEnd is None:
+                if self.chunk + 1 >= self.header.trackChunks:
+                    # everything after the last track is ignored
+                    pos = len(pending)
+                    break
+                # the ID and length of the next chunk
+                if len(pending) - pos < 8:
+                    break
+                trackID = bytes(pending[pos:pos + 4])
+                trackLength = int.from_bytes(pending[pos + 4:pos + 8], "big")
+                pos += 8
+                if trackID == b"MTrk":
+                    self.chunk += 1
+                    self.trackEnd = start + 8 + trackLength
+                    self.wallTime = 0
+                    self.previousState = 0
+                else:
+                    self.skipTo = start + 8 + trackLength
+            elif start >= self.trackEnd:
+                raise MIDIEventError("The track has no End Of Track event "
+                                     "(track " + str(self.chunk) + ")")
+            else:
+                if self.eventCount >= self.maxEvents:
+                    raise MIDILimitError("The stream has more than " +
+                                         str(self.maxEvents) + " events")
+                try:
+                    event, pos = self.decodeEvent(pending, pos)
+                except IndexError:
+                    # the rest of the event has not arrived yet
+                    break
+                self.eventCount += 1
+                if event is not None:
+                    events.append(event)
+
+        del pending[:pos]
+        self.offset += pos
+        return events
+
+    # decodes one event from the pending bytes, from the offset pos, in the same way as decodeTrack
+    # gives the event (None for a byte that is not recognised) and the offset after it, or raises
+    # IndexError if some of its bytes have not arrived yet
+    def decodeEvent(self, pending, pos):
+        # the offset in the pending bytes where the track ends
+        end = self.trackEnd - self.offset
+        statusTimeDelta, pos = readValue(pending, pos)
+        if pos >= end:
+            raise self.pastEnd()
+        status = pending[pos]
+        if status < 0x80:
+            status = self.previousState
+        else:
+            pos += 1
+
+        if status < 0x80:
+            # a data byte with no running status to use, it is read again as the next delta
+            self.wallTime += statusTimeDelta
+            return None, pos
+        elif status < 0xC0 or 0xE0 <= status < 0xF0:
+            if pos + 2 > end:
+                raise self.pastEnd()
+            data1 = pending[pos]
+            data2 = pending[pos + 1]
+            pos += 2
+            event = MIDIEvent.fromMessage(status, data1, data2,
+                                          statusTimeDelta)
+            self.previousState = status
+        elif status < 0xF0:
+            if pos + 1 > end:
+                raise self.pastEnd()
+            event = MIDIEvent.fromMessage(status, pending[pos], 0,
+                                          statusTimeDelta)
+            pos += 1
+            self.previousState = status
+        elif status == 0xFF or status == 0xF0 or status == 0xF7:
+            type = 0
+            if status == 0xFF:
+                if pos >= end:
+                    raise self.pastEnd()
+                type = pending[pos]
+                pos += 1
+            length, pos = readValue(pending, pos)
+            if length > self.maxEventLength:
+                raise MIDILimitError("Event of " + str(length) +
+                                     " bytes is longer than maxEventLength")
+            if pos + length > end:
+                raise self.pastEnd()
+            if pos + length > len(pending):
+                raise IndexError(pos + length)
+            event = MIDIMetaEvent(status, type,
+                                  bytes(pending[pos:pos + length]),
+                                  statusTimeDelta)
+            pos += length
+            self.previousState = 0
+            if status == 0xFF and type == 0x2F:
+                # anything left in the track after its End Of Track event is skipped
+                self.skipTo = self.trackEnd
+                self.trackEnd = None
+        else:
+            self.wallTime += statusTimeDelta
+            self.previousState = 0
+            return None, pos
+
+        self.wallTime += statusTimeDelta
+        return (self.chunk, self.wallTime, event), pos
+
+    # the error for an event that does not fit in what is left of its track
+    def pastEnd(self):
+        return MIDIEventError(
+            "The last event runs past the end of the track (track " +
+            str(self.chunk) + ")")
+
+    # checks that the stream ended after a whole file
+    def close(self):
+        if self.header is None:
+            if len(self.pending) < 14:
+                raise MIDIHeaderError("The stream ended before the header")
+            raise MIDIChunkError("The stream ended in the header chunk")
+        if (self.pending or self.trackEnd is not None
+                or self.offset < self.skipTo):
+            raise MIDIChunkError(
+                "The stream ended in the middle of a MIDI file")
+        if self.chunk + 1 < self.header.trackChunks:
+            raise MIDIChunkError("The stream ended after " +
+                                 str(self.chunk + 1) + " of " +
+                                 str(self.header.trackChunks) + " tracks")
+
+
+# goes through the events of a MIDI file read from an asyncio stream (e.g. an asyncio.StreamReader),
+# as each piece of it arrives
+# every event is yielded as a tuple (track index, absolute tick, event), like iter_events
+# chunkSize = the most bytes read at once, so only one piece of the stream is held at a time
+# and the stream is not read any faster than the events are used
+async def aiter_events(reader,
+                       chunkSize=1 << 16,
+                       maxEventLength=1 << 24,
+                       maxEvents=None):
+    decoder = MIDIStreamDecoder(maxEventLength, maxEvents)
+    while True:
+        data = await reader.read(chunkSize)
+        if not data:
+            break
+        for event in decoder.feed(data):
+            yield event
+    decoder.close()
+
+
+if __name__ == "__main__":
+    demo = MIDIFile("bach_846.mid")
+    print(demo.tracks[1].notes)
+    with open("openedMIDI.txt", "w") as f:
+        demo.dump(f)
+
+    # draws the notes of every track in its own color
+    from pianoroll import renderPNG
+
+    renderPNG(demo, "music.png", scale=4)
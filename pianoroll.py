@@ -0,0 +1,225 @@
+"""
+    Draws the notes of a parsed MIDI file as a piano roll, with NumPy instead of a plotting library
+
+    A piano roll is a matrix with a row for every key and a column for every step of time, where
+    every note fills the cells from its start to its end with its velocity. All the notes are
+    written at once: the cells of every note are worked out as arrays and written with one
+    np.maximum.at, so there is no loop over the notes in Python
+    The matrix can be used as it is (e.g. as the input of a model), or saved as a PNG image, which
+    is written with zlib and needs no display or plotting library, so whole corpora can be drawn
+
+    To draw every MIDI file in one or more directories (or files) from the command line:
+        python3 pianoroll.py path/to/midi/files --output-dir rolls --ticks 60 --workers 8
+"""
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import os
+import struct
+import zlib
+
+import numpy as np
+
+from corpus import findFiles
+from main import MIDIFile
+
+# the color of every track in an image, the tracks after the last color use the colors again
+TrackColors = np.array([(31, 119, 180), (255, 127, 14), (44, 160, 44),
+                        (214, 39, 40), (148, 103, 189), (140, 86, 75),
+                        (227, 119, 194), (127, 127, 127), (188, 189, 34),
+                        (23, 190, 207)],
+                       dtype=np.uint16)
+
+
+# the start, end, key, velocity and track of every note in a file, as NumPy arrays
+def noteArrays(midi):
+    columns = [track.noteTable.columns for track in midi.tracks]
+
+    def column(name, dtype):
+        return np.concatenate(
+            [np.frombuffer(c[name], dtype=dtype)
+             for c in columns] + [np.zeros(0, dtype=dtype)])
+
+    starts = column("start", np.uint64)
+    ends = starts + column("duration", np.uint64)
+    tracks = np.repeat(np.arange(len(columns)),
+                       [len(c["start"]) for c in columns])
+    return starts, ends, column("key", np.uint8), column("velocity",
+                                                         np.uint8), tracks
+
+
+# the piano roll of a file, as a matrix of velocities with a row for every key (the lowest key
+# first) and a column for every step of time
+# ticksPerColumn = how many ticks every column covers, by default a sixteenth note
+# secondsPerColumn = how many seconds every column covers instead, using the tempo map
+# byTrack = True gives a matrix for every track, with the shape (tracks, keys, columns)
+# minKey, maxKey = the keys in the rows (both included)
+# every note covers at least one column, and overlapping notes keep the highest velocity
+def pianoRoll(midi,
+              ticksPerColumn=None,
+              secondsPerColumn=None,
+              byTrack=False,
+              minKey=0,
+              maxKey=127):
+    starts, ends, keys, velocities, tracks = noteArrays(midi)
+    if secondsPerColumn is not None:
+        first = np.floor(
+            midi.tempoMap.ticksToSeconds(starts) / secondsPerColumn)
+        last = np.ceil(midi.tempoMap.ticksToSeconds(ends) / secondsPerColumn)
+    else:
+        if ticksPerColumn is None:
+            ticksPerColumn = max(1, (midi.header.division & 0x7FFF) // 4)
+        first = starts.astype(np.int64) // ticksPerColumn
+        last = -(-ends.astype(np.int64) // ticksPerColumn)
+    first = first.astype(np.int64)
+    lengths = np.maximum(last.astype(np.int64) - first, 1)
+
+    keep = (keys >= minKey) & (keys <= maxKey)
+    first, lengths, keys = first[keep], lengths[keep], keys[keep]
+    velocities, tracks = velocities[keep], tracks[keep]
+
+    columns = int((first + lengths).max()) if len(first) else 0
+    shape = (maxKey - minKey + 1, columns)
+    if byTrack:
+        shape = (len(midi.tracks), ) + shape
+    roll = np.zeros(shape, dtype=np.uint8)
+    if not len(first):
+        return roll
+
+    # every cell of every note: the note is repeated once for every column it covers, and the
+    # columns count up from its first one
+    offsets = np.cumsum(lengths) - lengths
+    cells = np.arange(int(lengths.sum())) - np.repeat(offsets, lengths)
+    index = (np.repeat(keys.astype(np.int64) - minKey,
+                       lengths), np.repeat(first, lengths) + cells)
+    if byTrack:
+        index = (np.repeat(tracks, lengths), ) + index
+    np.maximum.at(roll, index, np.repeat(velocities, lengths))
+    return roll
+
+
+# turns a piano roll into an image, with the highest key at the top
+# a single matrix gives a grayscale image, where brighter notes are louder
+# a matrix for every track gives a color image, where every cell has the color of the loudest track
+# and is brighter for louder notes
+# scale = how many pixels high and wide every cell is
+def toImage(roll, scale=1):
+    if roll.ndim == 2:
+        image = (roll[::-1].astype(np.uint16) * 255 // 127).astype(np.uint8)
+    else:
+        loudest = roll.argmax(axis=0)[::-1]
+        velocity = roll.max(axis=0)[::-1].astype(np.uint16)
+        colors = TrackColors[loudest % len(TrackColors)]
+        # the quietest notes still have half the brightness of the loudest ones
+        image = (colors * (velocity[..., None] + 127) // 254).astype(np.uint8)
+        image[velocity == 0] = 0
+    if scale > 1:
+        image = image.repeat(scale, axis=0).repeat(scale, axis=1)
+    return image
+
+
+# writes an image (a grayscale or RGB array of uint8) as a PNG file
+# f = a file name, or a file object opened in binary mode
+def writePNG(f, image):
+    height, width = image.shape[:2]
+    colorType = 2 if image.ndim == 3 else 0
+
+    def chunk(chunkID, data):
+        return (struct.pack(">I", len(data)) + chunkID + data +
+                struct.pack(">I", zlib.crc32(chunkID + data)))
+
+    # every row starts with its filter type, 0 for none
+    rows = np.zeros((height, 1 + image[0].size), dtype=np.uint8)
+    rows[:, 1:] = image.reshape(height, -1)
+    png = (
+        b"\x89PNG\r\n\x1a\n" +
+        chunk(b"IHDR",
+              struct.pack(">IIBBBBB", width, height, 8, colorType, 0, 0, 0)) +
+        chunk(b"IDAT", zlib.compress(rows.tobytes(), 6)) + chunk(b"IEND", b""))
+    if isinstance(f, (str, os.PathLike)):
+        with open(f, "wb") as out:
+            out.write(png)
+    else:
+        f.write(png)
+
+
+# draws a file as a PNG image, with every track in its own color
+# the rows only cover the keys the file uses, unless minKey and maxKey are given
+# gives the piano roll (a matrix for every track) that was drawn
+def renderPNG(midi,
+              f,
+              ticksPerColumn=None,
+              secondsPerColumn=None,
+              scale=1,
+              minKey=None,
+              maxKey=None):
+    keys = noteArrays(midi)[2]
+    if minKey is None:
+        minKey = int(keys.min()) if len(keys) else 0
+    if maxKey is None:
+        maxKey = int(keys.max()) if len(keys) else 127
+    roll = pianoRoll(midi, ticksPerColumn, secondsPerColumn, True, minKey,
+                     maxKey)
+    writePNG(f, toImage(roll, scale))
+    return roll
+
+
+# draws a single file in a worker, the image is saved in outputDirectory with the name of the file
+# gives the path of the image, or the error that stopped the file from being drawn
+def renderOne(filename, outputDirectory, ticksPerColumn, secondsPerColumn,
+              scale):
+    name = os.path.splitext(os.path.basename(filename))[0] + ".png"
+    try:
+        path = os.path.join(outputDirectory, name)
+        renderPNG(MIDIFile(filename), path, ticksPerColumn, secondsPerColumn,
+                  scale)
+        return path
+    except Exception as e:
+        return filename + ": " + type(e).__name__ + ": " + str(e)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Draw MIDI files as piano roll images")
+    parser.add_argument("paths",
+                        nargs="+",
+                        help="MIDI files or directories to search for them")
+    parser.add_argument("-o",
+                        "--output-dir",
+                        default=".",
+                        help="where the images are saved")
+    parser.add_argument("--ticks",
+                        type=int,
+                        default=None,
+                        help="ticks in every column (default: a sixteenth)")
+    parser.add_argument("--seconds",
+                        type=float,
+                        default=None,
+                        help="seconds in every column, instead of ticks")
+    parser.add_argument("--scale",
+                        type=int,
+                        default=1,
+                        help="pixels for every cell of the piano roll")
+    parser.add_argument(
+        "-j",
+        "--workers",
+        type=int,
+        default=None,
+        help="number of worker processes (default: one per CPU)")
+    args = parser.parse_args()
+
+    files = findFiles(args.paths)
+    os.makedirs(args.output_dir, exist_ok=True)
+    arguments = (files, [args.output_dir] * len(files),
+                 [args.ticks] * len(files), [args.seconds] * len(files),
+                 [args.scale] * len(files))
+    if args.workers == 1:
+        for result in map(renderOne, *arguments):
+            print(result)
+    else:
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            for result in pool.map(renderOne, *arguments, chunksize=8):
+                print(result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+    Checks that the files loaded from a MIDICache in cache.py are the same as the parsed files, and
+    can be changed like them
+
+    To run them:
+        python3 -m pytest test_cache.py
+"""
+import os
+import tempfile
+import unittest
+
+from benchmark import generateMIDI
+from cache import MIDICache
+from main import MIDIFile
+from test_parser import Directory, summary
+
+
+class CacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        generated = os.path.join(self.directory.name, "generated.mid")
+        with open(generated, "wb") as f:
+            f.write(generateMIDI(tracks=3, notes=300))
+        self.files = [os.path.join(Directory, "bach_846.mid"), generated]
+        self.cache = MIDICache(os.path.join(self.directory.name, "cache"))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def testHit(self):
+        for filename in self.files:
+            with self.subTest(filename=os.path.basename(filename)):
+                parsed = self.cache.load(filename)
+                cached = self.cache.load(filename)
+                self.assertIsNot(cached, parsed)
+                self.assertEqual(summary(cached), summary(MIDIFile(filename)))
+                self.assertEqual(bytes(cached.toBytes()),
+                                 bytes(MIDIFile(filename).toBytes()))
+        self.assertEqual((self.cache.hits, self.cache.misses), (2, 2))
+
+    def testEditLoaded(self):
+        self.cache.load(self.files[0])
+        cached = self.cache.load(self.files[0])
+        self.assertEqual(self.cache.hits, 1)
+
+        track = cached.tracks[1]
+        keys = track.eventTable.columns["key"]
+        statuses = track.eventTable.columns["status"]
+        first = next(i for i in range(len(keys)) if 0x90 <= statuses[i] < 0xA0)
+        key = keys[first]
+        keys[first] += 2
+        self.assertEqual(track.events[first].key, key + 2)
+
+        count = len(track.eventTable)
+        end = track.eventTable.columns["tick"][-1]
+        track.addMessage(0x90, 60, 100, 0, end)
+        self.assertEqual(len(track.events), count + 1)
+        self.assertEqual(track.events[count].key, 60)
+
+        # the cached file itself is not changed
+        self.assertEqual(summary(self.cache.load(self.files[0])),
+                         summary(MIDIFile(self.files[0])))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,349 @@
+"""
+    Checks the behaviour of the parser in main.py, e.g. that the ways of parsing a file agree with
+    each other
+
+    The checks on whole files run on bach_846.mid and on a file from benchmark.generateMIDI. To run
+    them:
+        python3 -m pytest test_parser.py
+    or, without pytest:
+        python3 -m unittest test_parser
+"""
+import io
+import json
+import os
+import struct
+import tempfile
+import unittest
+
+from benchmark import chunk, encodeValue, generateMIDI
+from main import (MIDIError, MIDIFile, MIDILimitError, MIDIStreamDecoder,
+                  MIDITempoMap, MIDITrack, iter_events)
+
+Directory = os.path.dirname(os.path.abspath(__file__))
+
+
+# everything a parse gives, as plain values that can be compared
+def summary(midi):
+    header = midi.header
+    return {
+        "header": (header.format, header.trackChunks, header.division),
+        "tempo": (midi.tempo, midi.bpm),
+        "tracks": [{
+            "name": track.name,
+            "instrument": track.instrument,
+            "notes": (track.minNote, track.maxNote),
+            "tempoChanges": track.tempoChanges,
+            "metaEvents": track.metaEvents,
+            "events": {
+                name: list(column)
+                for name, column in track.eventTable.columns.items()
+            },
+            "noteTable": {
+                name: list(column)
+                for name, column in track.noteTable.columns.items()
+            },
+        } for track in midi.tracks],
+    }
+
+
+class ParserTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        # every event uses running status where it can, as toBytes does, so it is written back
+        # as the same bytes
+        generated = os.path.join(cls.directory.name, "generated.mid")
+        with open(generated, "wb") as f:
+            f.write(generateMIDI(tracks=3, notes=300, runningStatus=1.0))
+        cls.files = [os.path.join(Directory, "bach_846.mid"), generated]
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.directory.cleanup()
+
+    def testParsersAgree(self):
+        for filename in self.files:
+            with self.subTest(filename=os.path.basename(filename)):
+                expected = summary(MIDIFile(filename))
+                self.assertEqual(summary(MIDIFile(filename, fromBuffer=False)),
+                                 expected)
+                self.assertEqual(summary(MIDIFile(filename, useMmap=True)),
+                                 expected)
+
+    def testLazyParse(self):
+        for filename in self.files:
+            with self.subTest(filename=os.path.basename(filename)):
+                lazy = MIDIFile(filename, lazy=True)
+                lazy.decodeAll()
+                self.assertEqual(summary(lazy), summary(MIDIFile(filename)))
+
+    def testLazyWriteBeforeRead(self):
+        lazy = MIDIFile(self.files[0], lazy=True)
+        track = lazy.tracks[1]
+        track.setName("b'Renamed'")
+        track.minNote = 0
+        self.assertEqual(len(track.events), 865)
+        self.assertEqual(track.name, "b'Renamed'")
+        self.assertEqual(track.minNote, 0)
+
+        written = MIDIFile()
+        written.parseBuffer(memoryview(bytes(lazy.toBytes())))
+        self.assertEqual(written.tracks[1].name, "b'Renamed'")
+
+    def testSetEvents(self):
+        with open(self.files[0], "rb") as f:
+            original = f.read()
+        midi = MIDIFile(self.files[0])
+        for track in midi.tracks:
+            track.setEvents(list(track.events))
+        # note ons with a velocity of 0 keep their status, so running status is kept
+        self.assertEqual(bytes(midi.toBytes()), original)
+
+        track = midi.tracks[1]
+        notes = list(track.notes)
+        track.setEvents(list(track.events)[:10])
+        self.assertEqual(len(track.eventTable), 10)
+        self.assertEqual(len(track.events), 10)
+        self.assertLess(len(track.noteTable), len(notes))
+        track.setEvents([])
+        self.assertEqual(len(track.eventTable), 0)
+        self.assertEqual(len(track.notes), 0)
+
+    def testNoteIndex(self):
+
+        def values(found):
+            return sorted(
+                (track, note.startTime, note.duration, note.key, note.velocity)
+                for track, note in found)
+
+        for filename in self.files:
+            midi = MIDIFile(filename)
+
+            # every note playing in a range, found by going through every note
+            def scan(startTick, endTick, minKey=0, maxKey=127):
+                return [
+                    (index, note) for index, track in enumerate(midi.tracks)
+                    for note in track.notes if note.duration
+                    and note.startTime < endTick and note.startTime +
+                    note.duration > startTick and minKey <= note.key <= maxKey
+                ]
+
+            end = max(note.startTime + note.duration for track in midi.tracks
+                      for note in track.notes)
+            with self.subTest(filename=os.path.basename(filename)):
+                for startTick in range(0, end + 480, end // 37 + 1):
+                    for length in (1, 60, 961):
+                        self.assertEqual(
+                            values(
+                                midi.notesBetween(startTick,
+                                                  startTick + length)),
+                            values(scan(startTick, startTick + length)))
+                    self.assertEqual(
+                        values(midi.notesAt(startTick, minKey=60, maxKey=72)),
+                        values(scan(startTick, startTick + 1, 60, 72)))
+
+    def testNoteIndexAfterChanges(self):
+        midi = MIDIFile(self.files[0])
+        before = len(midi.notesBetween(0, 1 << 32))
+        track = midi.tracks[1]
+        removed = len(track.noteTable)
+        track.setEvents(list(track.events)[:10])
+        removed -= len(track.noteTable)
+        # the index is built again, instead of pointing at notes that are not there anymore
+        self.assertEqual(len(midi.notesBetween(0, 1 << 32)), before - removed)
+
+        # a change in place needs a rebuild
+        first = midi.indexNotes().starts[0]
+        for track in midi.tracks:
+            starts = track.noteTable.columns["start"]
+            for i in range(len(starts)):
+                starts[i] += 100000
+        self.assertEqual(midi.indexNotes().starts[0], first)
+        self.assertEqual(
+            midi.indexNotes(rebuild=True).starts[0], first + 100000)
+
+    def testRoundTrip(self):
+        for filename in self.files:
+            with self.subTest(filename=os.path.basename(filename)):
+                with open(filename, "rb") as f:
+                    original = f.read()
+                midi = MIDIFile(filename)
+                self.assertEqual(bytes(midi.toBytes()), original)
+                midi.tracks[1].setName("Renamed")
+                written = MIDIFile()
+                written.parseBuffer(memoryview(bytes(midi.toBytes())))
+                self.assertEqual(written.tracks[1].name, "b'Renamed'")
+                self.assertEqual(
+                    summary(written)["tracks"][1]["events"],
+                    summary(midi)["tracks"][1]["events"])
+
+    def testWriteNewFile(self):
+        midi = MIDIFile()
+        track = MIDITrack()
+        midi.tracks.append(track)
+        track.setName("Piano")
+        track.addMessage(0x90, 60, 100, 0, 0)
+        track.addMessage(0x80, 60, 0, 480, 480)
+
+        written = MIDIFile()
+        written.parseBuffer(memoryview(bytes(midi.toBytes())))
+        header = written.header
+        self.assertEqual((header.format, header.trackChunks, header.division),
+                         (0, 1, MIDIFile.DefaultDivision))
+        self.assertEqual(written.tracks[0].name, "b'Piano'")
+        notes = written.tracks[0].notes
+        self.assertEqual(len(notes), 1)
+        self.assertEqual((notes[0].key, notes[0].startTime, notes[0].duration),
+                         (60, 0, 480))
+
+    def testStream(self):
+
+        def values(found):
+            return [(track, tick, repr(event), getattr(event, "channel", None))
+                    for track, tick, event in found]
+
+        for filename in self.files:
+            with open(filename, "rb") as f:
+                data = f.read()
+            expected = values(iter_events(filename))
+            for size in (1, 3, 7):
+                with self.subTest(filename=os.path.basename(filename),
+                                  size=size):
+                    decoder = MIDIStreamDecoder()
+                    found = []
+                    for pos in range(0, len(data), size):
+                        found += decoder.feed(data[pos:pos + size])
+                    decoder.close()
+                    self.assertEqual(values(found), expected)
+
+    def testTempoMap(self):
+        midi = MIDIFile()
+        track = MIDITrack()
+        midi.tracks.append(track)
+        # 60 bpm for two quarter notes, then 240 bpm
+        track.tempoChanges += [(0, 1000000), (960, 250000)]
+        track.addMessage(0x90, 60, 100, 0, 0)
+        track.addMessage(0x80, 60, 0, 1440, 1440)
+        written = MIDIFile()
+        written.parseBuffer(memoryview(bytes(midi.toBytes())))
+
+        tempoMap = written.tempoMap
+        ticks = [0, 480, 960, 1440]
+        seconds = [0.0, 1.0, 2.0, 2.25]
+        self.assertEqual([tempoMap.tickToSeconds(tick) for tick in ticks],
+                         seconds)
+        self.assertEqual(list(tempoMap.ticksToSeconds(ticks)), seconds)
+
+    def testTempoMapSMPTE(self):
+        # 25 frames per second of 40 ticks, and 29.97 frames per second of 100 ticks
+        tempoMap = MIDITempoMap((256 - 25) << 8 | 40, [(0, 1000000)])
+        self.assertEqual(tempoMap.tickToSeconds(500), 0.5)
+        self.assertEqual(list(tempoMap.ticksToSeconds([0, 1000])), [0.0, 1.0])
+        tempoMap = MIDITempoMap((256 - 29) << 8 | 100)
+        self.assertAlmostEqual(tempoMap.tickToSeconds(2997), 0.999999)
+
+    # writes a broken file next to the generated one, and gives its name
+    def brokenFile(self, name, data):
+        filename = os.path.join(self.directory.name, name)
+        with open(filename, "wb") as f:
+            f.write(data)
+        return filename
+
+    def testStrictAndLenient(self):
+        with open(self.files[0], "rb") as f:
+            data = f.read()
+        complete = MIDIFile(self.files[0])
+        header = chunk(b"MThd", struct.pack(">HHH", 0, 1, 480))
+        # a note, and a track without an End Of Track event
+        note = b"\x00\x90\x3C\x64\x83\x60\x80\x3C\x00"
+        cut = self.brokenFile("cut.mid", data[:len(data) // 2])
+        noEnd = self.brokenFile("noEnd.mid", header + chunk(b"MTrk", note))
+
+        for fromBuffer in (True, False):
+            with self.subTest(fromBuffer=fromBuffer):
+                for filename in (cut, noEnd):
+                    with self.assertRaises(MIDIError):
+                        MIDIFile(filename, fromBuffer, strict=True)
+
+                warnings = []
+                midi = MIDIFile(cut, fromBuffer, warn=warnings.append)
+                self.assertTrue(warnings)
+                self.assertEqual(len(midi.tracks), 3)
+                # the tracks before the problem are complete, and the track that is cut short keeps
+                # the events before it
+                self.assertEqual(
+                    summary(midi)["tracks"][1],
+                    summary(complete)["tracks"][1])
+                events = list(midi.tracks[2].events)
+                self.assertTrue(events)
+                self.assertEqual([repr(event) for event in events], [
+                    repr(event) for event in complete.tracks[2].events
+                ][:len(events)])
+
+                warnings = []
+                midi = MIDIFile(noEnd, fromBuffer, warn=warnings.append)
+                self.assertEqual(len(warnings), 1)
+                self.assertEqual(len(midi.tracks[0].notes), 1)
+
+    def testLimits(self):
+        for maxEvents in (0, 100):
+            with self.subTest(maxEvents=maxEvents):
+                # a limit is raised even when lenient
+                with self.assertRaises(MIDILimitError):
+                    MIDIFile(self.files[0], maxEvents=maxEvents)
+                with self.assertRaises(MIDILimitError):
+                    MIDIFile(self.files[0], False, maxEvents=maxEvents)
+        MIDIFile(self.files[0],
+                 maxEvents=len(list(iter_events(self.files[0]))))
+
+    def testStreamProblems(self):
+        header = chunk(b"MThd", struct.pack(">HHH", 0, 1, 480))
+        noEnd = header + chunk(b"MTrk", b"\x00\x90\x3C\x64")
+        # a text event of 100 bytes, in a track of 8
+        pastEnd = header + chunk(
+            b"MTrk", b"\x00\x90\x3C\x64\x00\xFF\x01" + encodeValue(100) + b"x")
+        for data in (noEnd, pastEnd):
+            decoder = MIDIStreamDecoder()
+            with self.assertRaises(MIDIError):
+                decoder.feed(data)
+                decoder.close()
+        with self.assertRaises(MIDILimitError):
+            MIDIStreamDecoder(
+                maxEvents=0).feed(header + chunk(b"MTrk", b"\x00\x90\x3C\x64"))
+
+    def testDump(self):
+        for filename in self.files:
+            with self.subTest(filename=os.path.basename(filename)):
+                midi = MIDIFile(filename)
+                first, second = io.StringIO(), io.StringIO()
+                midi.dump(first)
+                midi.dump(second)
+                self.assertEqual(first.getvalue(), second.getvalue())
+                self.assertEqual(first.getvalue(), repr(midi))
+
+    def testDumpJSON(self):
+        for filename in self.files:
+            with self.subTest(filename=os.path.basename(filename)):
+                midi = MIDIFile(filename)
+                f = io.StringIO()
+                midi.dump(f, format="jsonl")
+                lines = [
+                    json.loads(line) for line in f.getvalue().splitlines()
+                ]
+                self.assertEqual(lines[0]["kind"], "header")
+                self.assertEqual(lines[0]["trackChunks"], len(midi.tracks))
+
+                # every track, followed by its events and then its notes
+                kinds = [(line["track"], line["kind"]) for line in lines[1:]]
+                expected = []
+                for index, track in enumerate(midi.tracks):
+                    expected += [(index, "track")]
+                    expected += [(index, "event")] * len(track.eventTable)
+                    expected += [(index, "note")] * len(track.noteTable)
+                self.assertEqual(kinds, expected)
+                self.assertEqual(lines[1]["name"], midi.tracks[0].name)
+
+
+if __name__ == "__main__":
+    unittest.main()
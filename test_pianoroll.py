@@ -0,0 +1,90 @@
+"""
+    Checks the piano rolls of pianoroll.py against a piano roll drawn one note at a time
+
+    To run them:
+        python3 -m pytest test_pianoroll.py
+"""
+import math
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from benchmark import generateMIDI
+from main import MIDIFile
+from pianoroll import pianoRoll
+from test_parser import Directory
+
+
+# the piano roll of a file, drawn with a loop over every note
+def loopRoll(midi, ticksPerColumn, byTrack, minKey, maxKey):
+    cells = {}
+    for trackIndex, track in enumerate(midi.tracks):
+        for note in track.notes:
+            if not minKey <= note.key <= maxKey:
+                continue
+            first = note.startTime // ticksPerColumn
+            last = math.ceil((note.startTime + note.duration) / ticksPerColumn)
+            for column in range(first, max(last, first + 1)):
+                cell = (trackIndex if byTrack else 0, note.key - minKey,
+                        column)
+                cells[cell] = max(cells.get(cell, 0), note.velocity)
+
+    columns = max((cell[2] + 1 for cell in cells), default=0)
+    roll = np.zeros((len(midi.tracks), maxKey - minKey + 1, columns),
+                    dtype=np.uint8)
+    for cell, velocity in cells.items():
+        roll[cell] = velocity
+    return roll if byTrack else roll[0]
+
+
+class PianoRollTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        generated = os.path.join(cls.directory.name, "generated.mid")
+        with open(generated, "wb") as f:
+            f.write(generateMIDI(tracks=3, notes=300))
+        cls.files = [os.path.join(Directory, "bach_846.mid"), generated]
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.directory.cleanup()
+
+    def testAgainstLoop(self):
+        for filename in self.files:
+            midi = MIDIFile(filename)
+            for ticksPerColumn in (1, 60, 480):
+                for byTrack in (False, True):
+                    for minKey, maxKey in ((0, 127), (60, 72)):
+                        with self.subTest(filename=os.path.basename(filename),
+                                          ticksPerColumn=ticksPerColumn,
+                                          byTrack=byTrack,
+                                          keys=(minKey, maxKey)):
+                            np.testing.assert_array_equal(
+                                pianoRoll(midi,
+                                          ticksPerColumn,
+                                          byTrack=byTrack,
+                                          minKey=minKey,
+                                          maxKey=maxKey),
+                                loopRoll(midi, ticksPerColumn, byTrack, minKey,
+                                         maxKey))
+
+    def testSeconds(self):
+        midi = MIDIFile(self.files[0])
+        tempoMap = midi.tempoMap
+        roll = pianoRoll(midi, secondsPerColumn=0.05)
+        for track in midi.tracks:
+            for note in track.notes:
+                column = int(tempoMap.tickToSeconds(note.startTime) / 0.05)
+                self.assertGreaterEqual(roll[note.key, column], note.velocity)
+
+    def testEmpty(self):
+        roll = pianoRoll(MIDIFile(), ticksPerColumn=60)
+        self.assertEqual(roll.shape, (128, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()